@@ -0,0 +1,37 @@
+"""Side by side of two benchmarks.load result files.
+
+    python -m benchmarks.compare results/before.json results/after.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before: float | None, after: float | None) -> str:
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(before_path: str, after_path: str):
+    with open(before_path) as file:
+        before = json.load(file)
+    with open(after_path) as file:
+        after = json.load(file)
+    print(f"{before['meta'].get('git_revision')} -> {after['meta'].get('git_revision')}")
+    print(f"{'scenario':<28}" + "".join(f"{metric:>26}" for metric in METRICS))
+    for name in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old = before["scenarios"].get(name, {})
+        new = after["scenarios"].get(name, {})
+        cells = [f"{old.get(metric, '-')} -> {new.get(metric, '-')} ({change(old.get(metric), new.get(metric))})"
+                 for metric in METRICS]
+        print(f"{name:<28}" + "".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+    main(args.before, args.after)
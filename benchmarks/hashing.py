@@ -0,0 +1,67 @@
+"""Event loop latency of an unrelated endpoint while logins are hashing passwords.
+
+Compares bcrypt called inline (old behaviour) with the pooled Hasher API.
+
+    python -m benchmarks.hashing --logins 32 --probes 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "bench", "DB_USER": "bench",
+                    "DB_PASS": "bench", "SECRET": "bench", "ALGORITHM": "HS256",
+                    "ACCESS_TOKEN_EXPIRE_MINUTES": "30"}.items():
+    os.environ.setdefault(name, value)
+
+from src.auth.utils import Hasher  # noqa: E402
+
+PASSWORD = "T1letmeout1234"
+
+
+async def inline_login(hashed: str):
+    Hasher.verify_password(PASSWORD, hashed)
+
+
+async def pooled_login(hashed: str):
+    await Hasher.verify_password_async(PASSWORD, hashed)
+
+
+async def probe(latencies: list[float], count: int, interval: float):
+    """Stands in for a cheap endpoint: measures how late the loop schedules it"""
+    for _ in range(count):
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append((time.perf_counter() - started - interval) * 1000)
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def run(login, hashed: str, logins: int, probes: int) -> dict:
+    latencies: list[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(probe(latencies, probes, 0.005), *(login(hashed) for _ in range(logins)))
+    return {
+        "wall_s": round(time.perf_counter() - started, 3),
+        "probe_p50_ms": round(percentile(latencies, 50), 2),
+        "probe_p99_ms": round(percentile(latencies, 99), 2),
+        "probe_max_ms": round(max(latencies), 2),
+    }
+
+
+async def main(logins: int, probes: int):
+    hashed = Hasher.get_hashed_password(PASSWORD)
+    for name, login in (("inline", inline_login), ("pooled", pooled_login)):
+        print(name, await run(login, hashed, logins, probes))
+    Hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.probes))
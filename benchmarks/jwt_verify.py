@@ -0,0 +1,78 @@
+"""Access token verifications per second.
+
+Compares python-jose with the key passed as a string (old behaviour), PyJWT with a prepared key and the memoizing
+TokenVerifier, for HS256, ES256 and EdDSA. Requests are spread over --tokens distinct tokens, as many users would.
+
+    python -m benchmarks.jwt_verify --tokens 100 --verifications 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "bench", "DB_USER": "bench",
+                    "DB_PASS": "bench", "SECRET": "bench", "ALGORITHM": "HS256",
+                    "ACCESS_TOKEN_EXPIRE_MINUTES": "30"}.items():
+    os.environ.setdefault(name, value)
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519  # noqa: E402
+from jose import jwt as jose_jwt  # noqa: E402
+
+from src.auth.tokens import TokenVerifier  # noqa: E402
+
+SECRET = "bench-secret"
+PRIVATE_KEYS = {
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "EdDSA": ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def write_key(directory: Path, algorithm: str) -> tuple[Path, str]:
+    """Returns the private key file and the public key PEM"""
+    private_key = PRIVATE_KEYS[algorithm]()
+    path = directory / f"{algorithm.lower()}.pem"
+    path.write_bytes(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                               serialization.NoEncryption()))
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo)
+    return path, public_pem.decode()
+
+
+def rate(verify, tokens: list[str], verifications: int) -> float:
+    started = time.perf_counter()
+    for index in range(verifications):
+        verify(tokens[index % len(tokens)])
+    return round(verifications / (time.perf_counter() - started))
+
+
+def main(tokens: int, verifications: int):
+    expires = int(time.time()) + 3600
+    with tempfile.TemporaryDirectory() as directory:
+        for algorithm in ("HS256", "ES256", "EdDSA"):
+            if algorithm == "HS256":
+                key_path, jose_key = None, SECRET
+            else:
+                key_path, jose_key = write_key(Path(directory), algorithm)
+            verifier = TokenVerifier(algorithm, SECRET, private_key_path=key_path and str(key_path),
+                                     public_keys_dir=None, signing_kid=None, cache_size=tokens * 2, reload_seconds=60)
+            uncached = TokenVerifier(algorithm, SECRET, private_key_path=key_path and str(key_path),
+                                     public_keys_dir=None, signing_kid=None, cache_size=0, reload_seconds=60)
+            signed = [verifier.sign({"sub": str(index), "roles": ["User"], "ver": 0, "exp": expires})
+                      for index in range(tokens)]
+            results = {}
+            if algorithm != "EdDSA":
+                results["jose_per_call_key"] = rate(
+                    lambda token: jose_jwt.decode(token, jose_key, algorithms=[algorithm]), signed, verifications)
+            results["pyjwt_prepared_key"] = rate(uncached.verify, signed, verifications)
+            results["verifier_memoized"] = rate(verifier.verify, signed, verifications)
+            print(algorithm, "verifications/s", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100, help="distinct tokens, roughly active users")
+    parser.add_argument("--verifications", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.tokens, args.verifications)
@@ -0,0 +1,214 @@
+"""Closed-loop load driver against a running server.
+
+Every scenario runs for --duration seconds with --concurrency workers, each spread over the seeded users, and reports
+throughput and latency percentiles. Results are written as JSON, compare two runs with benchmarks.compare.
+
+The driver logs in from one address as few users, far above the default rate limits, so run the server with rate
+limiting off. A scenario with more than --max-rate-limited of 429 responses stops the run, its numbers would time the
+limiter rather than the endpoint.
+
+    python -m benchmarks.seed --users 20 --subjects 20 --tasks 50
+    RATELIMIT_ENABLED=false uvicorn src.main:app --workers 4
+    python -m benchmarks.load --users 20 --concurrency 32 --duration 20 --output results/load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.seed import PASSWORD
+from src.tracker.schemas import TaskSorts, SubjectSorts, TasksTypes, Priority
+
+
+@dataclass
+class BenchUser:
+    username: str
+    headers: dict = field(default_factory=dict)
+    subject_ids: list[str] = field(default_factory=list)
+    task_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ScenarioResult:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: dict[int, int] = field(default_factory=dict)
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        if len(latencies) < 2:
+            return {"requests": len(latencies), "errors": self.errors, "statuses": self.statuses}
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+
+
+async def timed(result: ScenarioResult, request) -> httpx.Response | None:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        result.errors += 1
+        return None
+    result.latencies.append((time.perf_counter() - started) * 1000)
+    result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+    if response.status_code >= 400:
+        result.errors += 1
+    return response
+
+
+"""Scenarios: one request per call, the user is picked by the worker"""
+
+
+async def login(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    await timed(result, client.post("/users/auth", data={"username": user.username, "password": PASSWORD}))
+
+
+async def users_me(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    await timed(result, client.get("/users/me", headers=user.headers))
+
+
+def list_tasks(sort: TaskSorts | None):
+    params = {"sort": sort.value} if sort is not None else {}
+
+    async def scenario(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+        await timed(result, client.get("/tasks/", params=params, headers=user.headers))
+    return scenario
+
+
+async def list_subjects_by_tasks_count(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    await timed(result, client.get("/subjects/", params={"sort": SubjectSorts.by_tasks_count.value},
+                                   headers=user.headers))
+
+
+def new_task(user: BenchUser) -> dict:
+    return {"name": "load test task", "deadline": None, "description": "created by benchmarks.load",
+            "type": TasksTypes.lab.value, "priority": Priority.medium.value, "subject_id": user.subject_ids[0]}
+
+
+async def create_task(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    response = await timed(result, client.post("/tasks/", json=new_task(user), headers=user.headers))
+    if response is not None and response.status_code == 200:
+        await client.delete(f"/tasks/{response.json()['id']}", headers=user.headers)
+
+
+async def update_task(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    task_id = user.task_ids[len(result.latencies) % len(user.task_ids)]
+    await timed(result, client.patch(f"/tasks/{task_id}", json={"status": len(result.latencies) % 2 == 0},
+                                     headers=user.headers))
+
+
+async def delete_task(client: httpx.AsyncClient, user: BenchUser, result: ScenarioResult):
+    response = await client.post("/tasks/", json=new_task(user), headers=user.headers)
+    if response.status_code == 200:
+        await timed(result, client.delete(f"/tasks/{response.json()['id']}", headers=user.headers))
+
+
+SCENARIOS = {
+    "login": login,
+    "users_me": users_me,
+    "tasks": list_tasks(None),
+    **{f"tasks_by_{sort.value}": list_tasks(sort) for sort in TaskSorts},
+    "subjects_by_tasks_count": list_subjects_by_tasks_count,
+    "task_create": create_task,
+    "task_update": update_task,
+    "task_delete": delete_task,
+}
+
+
+async def prepare_user(client: httpx.AsyncClient, username: str) -> BenchUser:
+    user = BenchUser(username)
+    response = await client.post("/users/auth", data={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get("/subjects/", params={"limit": 50}, headers=user.headers)
+    response.raise_for_status()
+    user.subject_ids = [subject["id"] for subject in response.json()]
+    response = await client.get("/tasks/", params={"limit": 100}, headers=user.headers)
+    response.raise_for_status()
+    user.task_ids = [task["id"] for task in response.json()]
+    return user
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario, users: list[BenchUser], concurrency: int,
+                       duration: float) -> dict:
+    result = ScenarioResult()
+    deadline = time.perf_counter() + duration
+    picker = itertools.cycle(users)
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await scenario(client, next(picker), result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return result.summary(time.perf_counter() - started)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rate_limited_share(summary: dict) -> float:
+    return summary["statuses"].get(429, 0) / summary["requests"] if summary["requests"] else 0.0
+
+
+async def main(base_url: str, users: int, prefix: str, concurrency: int, duration: float, scenarios: list[str],
+               output: str | None, max_rate_limited: float):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        bench_users = await asyncio.gather(*(prepare_user(client, f"{prefix}{index}") for index in range(users)))
+        results = {
+            "meta": {"started_at": datetime.now(timezone.utc).isoformat(), "git_revision": git_revision(),
+                     "python": platform.python_version(), "base_url": base_url, "users": users,
+                     "concurrency": concurrency, "duration_s": duration},
+            "scenarios": {},
+        }
+        for name in scenarios:
+            results["scenarios"][name] = await run_scenario(client, SCENARIOS[name], bench_users, concurrency,
+                                                            duration)
+            print(name, json.dumps(results["scenarios"][name]))
+            share = rate_limited_share(results["scenarios"][name])
+            if share > max_rate_limited:
+                raise SystemExit(f"{name}: {share:.1%} of responses were 429, run the server with "
+                                 f"RATELIMIT_ENABLED=false")
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="seeded users to spread the load over")
+    parser.add_argument("--prefix", default="bench_user_")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="run only these scenarios, may be repeated")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--max-rate-limited", type=float, default=0.01,
+                        help="largest share of 429 responses a scenario may have")
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.users, args.prefix, args.concurrency, args.duration,
+                     args.scenario or list(SCENARIOS), args.output, args.max_rate_limited))
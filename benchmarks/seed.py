@@ -0,0 +1,87 @@
+"""Seeding helpers for benchmarks. Talks to the database configured in .env.
+
+    python -m benchmarks.seed --users 10 --subjects 20 --tasks 50
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.auth.utils import Hasher
+from src.database import async_session
+from src.tracker.models import Subject as SubjectDB
+from src.tracker.models import Task as TaskDB
+from src.tracker.models import Teacher as TeacherDB
+from src.tracker.schemas import CreateSubject, CreateTask, CreateTeacher, Priority, TasksTypes
+
+PASSWORD = "T1letmeout1234"
+WORDS = ["lab", "report", "integral", "matrix", "compiler", "network", "database", "essay", "physics", "history",
+         "algebra", "kernel", "graph", "protocol", "thermodynamics", "presentation", "optics", "economy"]
+
+
+def random_text(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+
+async def seed_user(db_session: AsyncSession, username: str, subjects: int, tasks_per_subject: int,
+                    hashed_password: str | None = None) -> UUID:
+    """Creates a user with one teacher per subject and tasks_per_subject tasks in every subject"""
+    hashed_password = hashed_password or Hasher.get_hashed_password(PASSWORD)
+    res = await db_session.execute(insert(User).values(username=username, email=f"{username}@bench.example",
+                                                       hashed_password=hashed_password).returning(User.id))
+    user_id = res.scalar_one()
+
+    teachers = [CreateTeacher(name=random_text(1), surname=random_text(1), father_name=None, phone_number=None)
+                for _ in range(subjects)]
+    res = await db_session.execute(insert(TeacherDB).returning(TeacherDB.id),
+                                   [{**teacher.model_dump(), "user_id": user_id} for teacher in teachers])
+    teacher_ids = res.scalars().all()
+
+    subjects_rows = [CreateSubject(name=f"{random_text(2)} {index}", course=random.randint(1, 6), teacher_id=teacher_id)
+                     for index, teacher_id in enumerate(teacher_ids)]
+    res = await db_session.execute(insert(SubjectDB).returning(SubjectDB.id),
+                                   [{**subject.model_dump(), "user_id": user_id} for subject in subjects_rows])
+    subject_ids = res.scalars().all()
+
+    now = datetime.now(timezone.utc)
+    tasks = [CreateTask(name=random_text(3)[:100],
+                        deadline=now + timedelta(hours=random.randint(-24 * 30, 24 * 90)),
+                        description=random_text(20),
+                        type=random.choice(list(TasksTypes)),
+                        priority=random.choice(list(Priority)),
+                        subject_id=subject_id)
+             for subject_id in subject_ids for _ in range(tasks_per_subject)]
+    for start in range(0, len(tasks), 5000):
+        await db_session.execute(insert(TaskDB), [{**task.model_dump(), "user_id": user_id,
+                                                   "status": random.random() < 0.3}
+                                                  for task in tasks[start:start + 5000]])
+    await db_session.commit()
+    return user_id
+
+
+async def drop_user(db_session: AsyncSession, user_id: UUID):
+    await db_session.execute(delete(User).where(User.id == user_id))
+    await db_session.commit()
+
+
+async def main(users: int, subjects: int, tasks: int, prefix: str):
+    hashed_password = Hasher.get_hashed_password(PASSWORD)
+    async with async_session() as session:
+        for index in range(users):
+            await seed_user(session, f"{prefix}{index}", subjects, tasks, hashed_password)
+    print(f"seeded {users} users x {subjects} subjects x {tasks} tasks, password {PASSWORD}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--subjects", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=50, help="tasks per subject")
+    parser.add_argument("--prefix", default="bench_user_")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.subjects, args.tasks, args.prefix))
@@ -0,0 +1,90 @@
+"""Rows per second of the list response encoding: FastAPI's response_model validation of ORM objects, the compiled
+TypeAdapter of the list (the default path) and plain rows encoded straight to JSON bytes (?fast=true).
+No database needed.
+
+    python -m benchmarks.serialization --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "bench", "DB_USER": "bench",
+                    "DB_PASS": "bench", "SECRET": "bench", "ALGORITHM": "HS256",
+                    "ACCESS_TOKEN_EXPIRE_MINUTES": "30"}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from src.serialization import dump_json, model_response  # noqa: E402
+from src.tracker.schemas import TaskResponse, TaskResponseList  # noqa: E402
+from src.tracker.service import task_row_to_dict  # noqa: E402
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    teacher_id, subject_id = uuid.uuid4(), uuid.uuid4()
+    return [{
+        "id": uuid.uuid4(), "name": f"lab {index}", "deadline": now + timedelta(hours=index),
+        "description": "implement and defend the lab " * 3, "type": "Lab", "priority": "Medium", "status": False,
+        "subject_id": subject_id, "subject_name": "Databases", "subject_course": 3,
+        "teacher_id": teacher_id, "teacher_name": "Edgar", "teacher_surname": "Codd", "teacher_father_name": None,
+        "teacher_phone_number": None,
+    } for index in range(count)]
+
+
+def as_orm_objects(rows: list[dict]) -> list[SimpleNamespace]:
+    """Stand-ins for Task ORM instances with subject and teacher loaded"""
+    objects = []
+    for row in rows:
+        teacher = SimpleNamespace(id=row["teacher_id"], name=row["teacher_name"], surname=row["teacher_surname"],
+                                  father_name=row["teacher_father_name"], phone_number=row["teacher_phone_number"])
+        subject = SimpleNamespace(id=row["subject_id"], name=row["subject_name"], course=row["subject_course"],
+                                  teacher=teacher)
+        objects.append(SimpleNamespace(subject=subject, **{key: row[key] for key in
+                                                           ("id", "name", "deadline", "description", "type",
+                                                            "priority", "status")}))
+    return objects
+
+
+async def response_model_path(objects) -> bytes:
+    field = create_response_field(name="response", type_=list[TaskResponse])
+    content = await serialize_response(field=field, response_content=objects)
+    return JSONResponse(content).body
+
+
+async def type_adapter_path(objects) -> bytes:
+    return model_response(TaskResponseList, objects).body
+
+
+async def fast_path(rows) -> bytes:
+    return dump_json([task_row_to_dict(row) for row in rows])
+
+
+async def measure(func, data) -> float:
+    started = time.perf_counter()
+    await func(data)
+    return len(data) / (time.perf_counter() - started)
+
+
+async def main(sizes: list[int]):
+    for size in sizes:
+        rows = make_rows(size)
+        objects = as_orm_objects(rows)
+        before = await measure(response_model_path, objects)
+        adapter = await measure(type_adapter_path, objects)
+        fast = await measure(fast_path, rows)
+        print(f"{size:>7} rows: response_model {before:>10,.0f} rows/s, type_adapter {adapter:>10,.0f} rows/s "
+              f"x{adapter / before:.1f}, fast {fast:>10,.0f} rows/s x{fast / before:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes))
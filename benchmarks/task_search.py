@@ -0,0 +1,68 @@
+"""GET /tasks/search against pulling the whole task list and filtering it on the client, on a seeded corpus.
+
+Runs the service functions and the response encoding directly, no HTTP or auth involved.
+
+    python -m benchmarks.task_search --tasks 50000 --query "matrix kernel"
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.seed import seed_user, drop_user
+from src.database import async_session
+from src.tracker.schemas import TaskResponse
+from src.tracker.service import get_tasks_by_user_id, search_tasks_by_user_id
+
+
+async def client_filter(user_id, search_query: str, limit: int, session) -> bytes:
+    tasks, _ = await get_tasks_by_user_id(user_id, None, False, None, None, None, None, 10 ** 9, session)
+    words = search_query.lower().split()
+    found = [task for task in tasks
+             if all(word in f"{task.name} {task.description or ''}".lower() for word in words)][:limit]
+    return json.dumps(jsonable_encoder([TaskResponse.model_validate(task) for task in found])).encode()
+
+
+async def search(user_id, search_query: str, limit: int, session) -> bytes:
+    tasks = await search_tasks_by_user_id(user_id, search_query, None, None, None, limit, session)
+    return json.dumps(jsonable_encoder([TaskResponse.model_validate(task) for task in tasks])).encode()
+
+
+async def measure(func, user_id, search_query: str, limit: int, runs: int) -> dict:
+    timings = []
+    payload = b""
+    for _ in range(runs):
+        async with async_session() as session:
+            started = time.perf_counter()
+            payload = await func(user_id, search_query, limit, session)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"payload_bytes": len(payload), "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2)}
+
+
+async def main(tasks: int, subjects: int, search_query: str, limit: int, runs: int):
+    async with async_session() as session:
+        user_id = await seed_user(session, f"bench_search_{uuid.uuid4().hex[:8]}", subjects, tasks // subjects)
+    try:
+        results = {"tasks": tasks, "query": search_query,
+                   "client_filter": await measure(client_filter, user_id, search_query, limit, runs),
+                   "search": await measure(search, user_id, search_query, limit, runs)}
+        print(json.dumps(results, indent=2))
+    finally:
+        async with async_session() as session:
+            await drop_user(session, user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=50000)
+    parser.add_argument("--subjects", type=int, default=20)
+    parser.add_argument("--query", default="matrix kernel")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.subjects, args.query, args.limit, args.runs))
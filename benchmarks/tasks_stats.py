@@ -0,0 +1,61 @@
+"""GET /tasks/stats against pulling the whole task list, for one user with many tasks.
+
+Runs the service functions and the response encoding directly, no HTTP or auth involved.
+
+    python -m benchmarks.tasks_stats --tasks 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.seed import seed_user, drop_user
+from src.database import async_session
+from src.tracker.schemas import TaskResponse
+from src.tracker.service import get_tasks_by_user_id, get_tasks_stats_by_user_id
+
+
+async def full_list(user_id, session) -> bytes:
+    tasks, _ = await get_tasks_by_user_id(user_id, None, False, None, None, None, None, 10 ** 9, session)
+    return json.dumps(jsonable_encoder([TaskResponse.model_validate(task) for task in tasks])).encode()
+
+
+async def stats(user_id, session) -> bytes:
+    return (await get_tasks_stats_by_user_id(user_id, session)).model_dump_json().encode()
+
+
+async def measure(func, user_id, runs: int) -> dict:
+    timings = []
+    payload = b""
+    for _ in range(runs):
+        async with async_session() as session:
+            started = time.perf_counter()
+            payload = await func(user_id, session)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"payload_bytes": len(payload), "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2)}
+
+
+async def main(tasks: int, subjects: int, runs: int):
+    async with async_session() as session:
+        user_id = await seed_user(session, f"bench_stats_{uuid.uuid4().hex[:8]}", subjects, tasks // subjects)
+    try:
+        results = {"tasks": tasks, "full_list": await measure(full_list, user_id, runs),
+                   "stats": await measure(stats, user_id, runs)}
+        print(json.dumps(results, indent=2))
+    finally:
+        async with async_session() as session:
+            await drop_user(session, user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--subjects", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.subjects, args.runs))
@@ -0,0 +1,49 @@
+"""add listing indexes and priority rank
+
+Revision ID: 2cef6e6dc401
+Revises: 0a51f4e4abe8
+Create Date: 2026-10-18 12:04:37.512831
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2cef6e6dc401'
+down_revision = '0a51f4e4abe8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('priority_rank', sa.SmallInteger(), sa.Computed(
+        "CASE priority WHEN 'Low' THEN 1 WHEN 'Medium' THEN 2 WHEN 'High' THEN 3 END", persisted=True), nullable=True))
+    op.create_index('ix_tasks_user_id_deadline', 'tasks', ['user_id', 'deadline', 'id'], unique=False)
+    op.create_index('ix_tasks_user_id_priority_rank', 'tasks', ['user_id', 'priority_rank', 'id'], unique=False)
+    op.create_index('ix_tasks_user_id_name', 'tasks', ['user_id', 'name', 'id'], unique=False)
+    op.create_index('ix_tasks_user_id_type', 'tasks', ['user_id', 'type', 'id'], unique=False)
+    op.create_index('ix_tasks_user_id_status', 'tasks', ['user_id', 'status', 'id'], unique=False)
+    op.create_index('ix_tasks_subject_id', 'tasks', ['subject_id'], unique=False)
+    op.create_index('ix_teachers_user_id_name', 'teachers', ['user_id', 'name', 'id'], unique=False)
+    op.create_index('ix_teachers_user_id_surname', 'teachers', ['user_id', 'surname', 'id'], unique=False)
+    op.create_index('ix_teachers_user_id_father_name', 'teachers', ['user_id', 'father_name', 'id'], unique=False)
+    op.create_index('ix_subjects_user_id_name', 'subjects', ['user_id', 'name', 'id'], unique=False)
+    op.create_index('ix_subjects_user_id_course', 'subjects', ['user_id', 'course', 'id'], unique=False)
+    op.create_index('ix_subjects_teacher_id', 'subjects', ['teacher_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_subjects_teacher_id', table_name='subjects')
+    op.drop_index('ix_subjects_user_id_course', table_name='subjects')
+    op.drop_index('ix_subjects_user_id_name', table_name='subjects')
+    op.drop_index('ix_teachers_user_id_father_name', table_name='teachers')
+    op.drop_index('ix_teachers_user_id_surname', table_name='teachers')
+    op.drop_index('ix_teachers_user_id_name', table_name='teachers')
+    op.drop_index('ix_tasks_subject_id', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_status', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_type', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_name', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_priority_rank', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_deadline', table_name='tasks')
+    op.drop_column('tasks', 'priority_rank')
@@ -0,0 +1,25 @@
+"""add open tasks deadline index
+
+Revision ID: 8e41f07a2c6d
+Revises: 5d3c9b1e7f20
+Create Date: 2026-10-18 16:47:12.905314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41f07a2c6d'
+down_revision = '5d3c9b1e7f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tasks_user_id_deadline_open', 'tasks', ['user_id', 'deadline', 'id'], unique=False,
+                    postgresql_where=sa.text('status = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_user_id_deadline_open', table_name='tasks', postgresql_where=sa.text('status = false'))
@@ -0,0 +1,25 @@
+"""add reminder deadline index
+
+Revision ID: c2a7d95e4b18
+Revises: 8e41f07a2c6d
+Create Date: 2026-10-18 17:30:54.118263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a7d95e4b18'
+down_revision = '8e41f07a2c6d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tasks_deadline_open', 'tasks', ['deadline'], unique=False,
+                    postgresql_where=sa.text('status = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_deadline_open', table_name='tasks', postgresql_where=sa.text('status = false'))
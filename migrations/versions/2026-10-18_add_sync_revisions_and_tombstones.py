@@ -0,0 +1,43 @@
+"""add sync revisions and tombstones
+
+Revision ID: 4f9be0c1d873
+Revises: c2a7d95e4b18
+Create Date: 2026-10-18 18:12:40.651207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f9be0c1d873'
+down_revision = 'c2a7d95e4b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('tracker_tombstones',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.Column('revision', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'entity', 'entity_id')
+    )
+    op.create_index('ix_tracker_tombstones_user_id_revision', 'tracker_tombstones', ['user_id', 'revision'],
+                    unique=False)
+    for table in ('teachers', 'subjects', 'tasks'):
+        op.add_column(table, sa.Column('revision', sa.BigInteger(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'),
+                                       nullable=False))
+        op.create_index(f'ix_{table}_user_id_revision', table, ['user_id', 'revision'], unique=False)
+
+
+def downgrade() -> None:
+    for table in ('tasks', 'subjects', 'teachers'):
+        op.drop_index(f'ix_{table}_user_id_revision', table_name=table)
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'revision')
+    op.drop_index('ix_tracker_tombstones_user_id_revision', table_name='tracker_tombstones')
+    op.drop_table('tracker_tombstones')
@@ -0,0 +1,29 @@
+"""add tracker revisions
+
+Revision ID: a76b261af074
+Revises: 2cef6e6dc401
+Create Date: 2026-10-18 15:21:09.184022
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a76b261af074'
+down_revision = '2cef6e6dc401'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('tracker_revisions',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('revision', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tracker_revisions')
@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from src.auth.schemas import UserInDB
+from src.config import settings
+
+"""In-process cache of authenticated users"""
+
+
+class PrincipalCache:
+    """LRU cache keyed by token subject. Entries live no longer than ttl. Every token is verified, expiry included,
+    before its subject is looked up, so an entry outliving a token does not extend the token"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[UserInDB, float]] = OrderedDict()
+
+    def get(self, subject: str) -> UserInDB | None:
+        entry = self._entries.get(subject)
+        if entry is None:
+            self.misses += 1
+            return
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[subject]
+            self.misses += 1
+            return
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return user
+
+    def set(self, subject: str, user: UserInDB):
+        if self.max_size <= 0:
+            return
+        self._entries[subject] = (user, time.monotonic() + self.ttl)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID):
+        for subject in [subject for subject, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[subject]
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
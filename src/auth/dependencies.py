@@ -2,34 +2,49 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import Depends, Path
-from jose import jwt, JWTError
+from jwt import PyJWTError
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.auth.cache import principal_cache
 from src.auth.exceptions import credentials_exception
-from src.auth.schemas import Roles, TokenData, UserInDB
-from src.auth.service import get_user_by_username, oauth2_scheme, get_user_by_id
+from src.auth.schemas import UserInDB, Principal
+from src.auth.service import oauth2_scheme, get_user_by_id
+from src.auth.tokens import token_verifier
 from src.auth.utils import check_access_permissions
-from src.config import settings
 from src.database import get_session
 from src.exceptions import not_found_exception
+from src.metrics import timed_stage
 from src.tracker.exceptions import not_enough_permissions_exception as tracker_not_enough_permissions_exception
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
-                           db_session: Annotated[AsyncSession, Depends(get_session)]):
-    try:
-        payload = jwt.decode(token, settings.secret, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
-        roles: list[Roles] = payload.get("roles")
-        if username is None:
+async def get_current_principal(token: Annotated[str, Depends(oauth2_scheme)]) -> Principal:
+    """Authorizes from the verified access token alone, without reading the user"""
+    with timed_stage("auth"):
+        try:
+            with timed_stage("jwt"):
+                payload = token_verifier.verify(token)
+            return Principal(id=payload.get("sub"), roles=payload.get("roles"), token_version=payload.get("ver"))
+        except (PyJWTError, ValidationError):
             raise credentials_exception
-        token_data = TokenData(username=username, roles=roles)
-    except JWTError:
-        raise credentials_exception
-    user = await get_user_by_username(token_data.username, db_session)
-    if user is None:
-        raise credentials_exception
-    return user
+
+
+async def get_current_user(principal: Annotated[Principal, Depends(get_current_principal)],
+                           db_session: Annotated[AsyncSession, Depends(get_session)]) -> UserInDB:
+    """The full user for endpoints that return it. Tokens issued before the last token version bump are rejected.
+    A version that differs from the cached user is checked against the database, the cache of this worker may
+    predate the bump. Other workers keep accepting tokens of the old version until their cached user expires,
+    at most principal_cache_ttl_seconds after the bump"""
+    with timed_stage("auth"):
+        user = principal_cache.get(str(principal.id))
+        if user is None or user.token_version != principal.token_version:
+            user = await get_user_by_id(principal.id, db_session)
+            if user is None:
+                raise credentials_exception
+            principal_cache.set(str(principal.id), user)
+        if user.token_version != principal.token_version:
+            raise credentials_exception
+        return user
 
 
 async def check_user_id(user_id: Annotated[UUID, Path()], db_session: Annotated[AsyncSession, Depends(get_session)]):
@@ -40,6 +55,6 @@ async def check_user_id(user_id: Annotated[UUID, Path()], db_session: Annotated[
 
 
 async def check_access(target_user: Annotated[UserInDB, Depends(check_user_id)],
-                       current_user: Annotated[UserInDB, Depends(get_current_user)]):
+                       current_user: Annotated[Principal, Depends(get_current_principal)]):
     if not check_access_permissions(current_user, target_user):
         raise tracker_not_enough_permissions_exception
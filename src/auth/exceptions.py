@@ -10,4 +10,13 @@ incorrect_auth_data_exception = HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+too_many_requests_exception = HTTPException(
+    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    detail="Server is busy, try again later",
+    headers={"Retry-After": "1"},
+)
+invalid_refresh_token_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid refresh token",
+)
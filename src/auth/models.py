@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, TIMESTAMP, Column, UUID, ARRAY, MetaData
+from sqlalchemy import String, TIMESTAMP, Column, UUID, ARRAY, MetaData, Float, Index, Integer, ForeignKey, func
 
 from src.auth.schemas import Roles
 from src.database import Base
@@ -23,4 +23,34 @@ class User(Base):
     )
     username = Column(String, unique=True, nullable=False)
     created = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
-    roles = Column(ARRAY(String), nullable=False, default=[Roles.user])
\ No newline at end of file
+    roles = Column(ARRAY(String), nullable=False, default=[Roles.user])
+    token_version = Column(Integer, nullable=False, server_default='0')
+
+
+class RefreshToken(Base):
+    """Refresh tokens are stored as sha256 of the token. Every refresh uses up the token and issues the next one of the
+    same family, presenting a used token again revokes the whole family"""
+    __tablename__ = 'refresh_tokens'
+    metadata = metadata
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    token_hash = Column(String(length=64), nullable=False, unique=True)
+    created = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    used_at = Column(TIMESTAMP(timezone=True), default=None)
+
+
+class RateLimitBucket(Base):
+    """Shared rate limiter state. Losing it on a crash only resets the limits, so the table is unlogged"""
+    __tablename__ = 'rate_limit_buckets'
+    __table_args__ = (
+        Index('ix_rate_limit_buckets_updated_at', 'updated_at'),
+        {"prefixes": ["UNLOGGED"]},
+    )
+    metadata = metadata
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
@@ -1,24 +1,26 @@
-from datetime import timedelta
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.dependencies import get_current_user, check_user_id, check_access
-from src.auth.exceptions import already_busy_exception, incorrect_auth_data_exception
-from src.auth.schemas import CreateUser, ShowUser, ShowDeletedUser, ShowUpdatedUser, UpdateUserRequest, Token, UserInDB
-from src.auth.service import create_new_user, delete_user_by_id, get_user_by_id, update_user, authenticate_user
-from src.auth.utils import create_access_token
-from src.config import settings
+from src.auth.exceptions import already_busy_exception, incorrect_auth_data_exception, invalid_refresh_token_exception
+from src.auth.schemas import (CreateUser, ShowUser, ShowDeletedUser, ShowUpdatedUser, UpdateUserRequest, Token,
+                              UserInDB, RefreshedToken, RefreshTokenRequest)
+from src.auth.service import (create_new_user, delete_user_by_id, get_user_by_id, update_user, authenticate_user,
+                              issue_refresh_token, rotate_refresh_token, revoke_refresh_token)
+from src.auth.utils import create_user_access_token
 from src.database import get_session
 from src.exceptions import empty_body_exception
+from src.metrics import ProfiledRoute
+from src.ratelimit import limit_login, limit_registration, limit_refresh
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=ProfiledRoute)
 
 
-@router.post("/", response_model=ShowUser)
+@router.post("/", response_model=ShowUser, dependencies=[Depends(limit_registration)])
 async def registration(user: Annotated[CreateUser, Body(title='Registration body')],
                        session: AsyncSession = Depends(get_session)) -> ShowUser:
     new_user = await create_new_user(user, session)
@@ -50,7 +52,7 @@ async def get_user(user_id: UUID, session: AsyncSession = Depends(get_session))
 async def update_user_by_id(user_id: UUID, body: UpdateUserRequest,
                             session: Annotated[AsyncSession, Depends(get_session)],
                             ) -> ShowUpdatedUser:
-    if body.dict(exclude_none=True) == {}:
+    if body.model_dump(exclude_none=True) == {}:
         raise empty_body_exception
     updated_user = await update_user(user_id, body, session)
     if not updated_user:
@@ -58,15 +60,31 @@ async def update_user_by_id(user_id: UUID, body: UpdateUserRequest,
     return updated_user
 
 
-@router.post("/auth", response_model=Token)
+@router.post("/auth", response_model=Token, dependencies=[Depends(limit_login)])
 async def login_for_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
                           session: Annotated[AsyncSession, Depends(get_session)]):
     user = await authenticate_user(form_data.username, form_data.password, session)
     if not user:
         raise incorrect_auth_data_exception
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(data={"sub": user.username, "roles": user.roles},
-                                       expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer", "user": user}
+    refresh_token = await issue_refresh_token(user.id, session)
+    await session.commit()
+    return {"access_token": create_user_access_token(user), "refresh_token": refresh_token, "token_type": "bearer",
+            "user": user}
+
+
+@router.post("/auth/refresh", response_model=RefreshedToken, dependencies=[Depends(limit_refresh)])
+async def refresh_access_token(body: RefreshTokenRequest, session: Annotated[AsyncSession, Depends(get_session)]):
+    rotated = await rotate_refresh_token(body.refresh_token, session)
+    if rotated is None:
+        raise invalid_refresh_token_exception
+    principal, refresh_token = rotated
+    return {"access_token": create_user_access_token(principal), "refresh_token": refresh_token,
+            "token_type": "bearer"}
+
+
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: RefreshTokenRequest, session: Annotated[AsyncSession, Depends(get_session)],
+                 everywhere: bool = False):
+    await revoke_refresh_token(body.refresh_token, everywhere, session)
 
 
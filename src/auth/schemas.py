@@ -1,8 +1,9 @@
+import re
 from datetime import datetime
 from enum import Enum
 from uuid import UUID
 
-from pydantic import BaseModel, EmailStr, UUID4, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, UUID4, Field, field_validator
 
 """Pydantic модели"""
 
@@ -12,21 +13,30 @@ class Roles(str, Enum):
     admin = 'Admin'
 
 
+PASSWORD_PATTERN = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?!.*\s).*$")
+
+
 class CreateUser(BaseModel):
-    username: str = Field(min_length=4, max_length=100, regex=r"^[a-zA-Z0-9_]+$")
+    username: str = Field(min_length=4, max_length=100, pattern=r"^[a-zA-Z0-9_]+$")
     email: EmailStr
-    password: str = Field(min_length=10, max_length=500,
-                          regex=r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?!.*\s).*$")
-
-    class Config:
-        schema_extra = {
-            "example":
-                {
-                 "username": "Faker",
-                 "email": "thebestmidlaner@gmail.com",
-                 "password": "T1letmeout1234"
-                }
-        }
+    password: str = Field(min_length=10, max_length=500)
+
+    model_config = ConfigDict(json_schema_extra={
+        "example":
+            {
+             "username": "Faker",
+             "email": "thebestmidlaner@gmail.com",
+             "password": "T1letmeout1234"
+            }
+    })
+
+    @field_validator("password")
+    @classmethod
+    def check_password(cls, password: str) -> str:
+        """pydantic-core patterns have no lookarounds, the password rule is checked with re"""
+        if not PASSWORD_PATTERN.match(password):
+            raise ValueError("Password must contain a digit, a lowercase and an uppercase letter and no whitespace")
+        return password
 
 
 class ShowUser(BaseModel):
@@ -41,6 +51,7 @@ class UserInDB(ShowUser):
     id: UUID
     hashed_password: str
     roles: list[Roles]
+    token_version: int = 0
 
 
 class ShowDeletedUser(BaseModel):
@@ -52,19 +63,32 @@ class ShowUpdatedUser(BaseModel):
 
 
 class UpdateUserRequest(BaseModel):
-    username: str | None
-    email: EmailStr | None
+    username: str | None = None
+    email: EmailStr | None = None
 
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
     user: ShowUser
 
 
-class TokenData(BaseModel):
-    username: str | None = None
+class RefreshedToken(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class Principal(BaseModel):
+    """Everything authorization needs, taken from the access token claims"""
+    id: UUID
     roles: list[Roles]
+    token_version: int
 
 
 
@@ -1,12 +1,19 @@
+import hashlib
+import secrets
+import uuid
+from datetime import timedelta
 from uuid import UUID
 
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import insert, delete, select, update, or_
+from sqlalchemy import insert, delete, select, update, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.models import User
-from src.auth.schemas import CreateUser, ShowUser, ShowDeletedUser, ShowUpdatedUser, UpdateUserRequest, UserInDB
+from src.auth.cache import principal_cache
+from src.auth.models import User, RefreshToken
+from src.auth.schemas import (CreateUser, ShowUser, ShowDeletedUser, ShowUpdatedUser, UpdateUserRequest, UserInDB,
+                              Principal)
 from src.auth.utils import Hasher
+from src.config import settings
 
 """Services"""
 
@@ -19,7 +26,8 @@ async def create_new_user(user: CreateUser, db_session: AsyncSession) -> ShowUse
     if user_by_email or user_by_username:
         return
 
-    query = insert(User).values(hashed_password=Hasher.get_hashed_password(user.password), email=user.email,
+    hashed_password = await Hasher.get_hashed_password_async(user.password)
+    query = insert(User).values(hashed_password=hashed_password, email=user.email,
                                 username=user.username).returning(User)
     res = await db_session.execute(query)
     new_user = res.fetchone()[0]
@@ -35,6 +43,7 @@ async def delete_user_by_id(user_id: UUID, db_session: AsyncSession) -> ShowDele
     query = delete(User).where(User.id == user_id).returning(User.id)
     res = await db_session.execute(query)
     await db_session.commit()
+    principal_cache.invalidate(user_id)
     deleted_user_row = res.fetchone()
     if deleted_user_row is not None:
         return ShowDeletedUser(id=deleted_user_row[0])
@@ -50,7 +59,8 @@ async def get_user_by_id(user_id: UUID, db_session: AsyncSession) -> UserInDB |
                         email=user_row[0].email,
                         created=user_row[0].created,
                         hashed_password=user_row[0].hashed_password,
-                        roles=user_row[0].roles
+                        roles=user_row[0].roles,
+                        token_version=user_row[0].token_version
                         )
 
 
@@ -64,7 +74,8 @@ async def get_user_by_username(username_or_email: str, db_session: AsyncSession)
                         hashed_password=selected_user[0].hashed_password,
                         username=selected_user[0].username,
                         created=selected_user[0].created,
-                        roles=selected_user[0].roles)
+                        roles=selected_user[0].roles,
+                        token_version=selected_user[0].token_version)
 
 
 async def update_user(user_id: UUID, body: UpdateUserRequest, db_session: AsyncSession) -> ShowUpdatedUser | None:
@@ -76,9 +87,10 @@ async def update_user(user_id: UUID, body: UpdateUserRequest, db_session: AsyncS
     if user_by_username and user_by_username.id != user_id:
         return
 
-    query = update(User).where(User.id == user_id).values(**body.dict(exclude_none=True)).returning(User.id)
+    query = update(User).where(User.id == user_id).values(**body.model_dump(exclude_none=True)).returning(User.id)
     res = await db_session.execute(query)
     await db_session.commit()
+    principal_cache.invalidate(user_id)
     updated_user_row = res.fetchone()
     return ShowUpdatedUser(id=updated_user_row[0])
 
@@ -87,6 +99,68 @@ async def authenticate_user(username_or_email: str, password: str, db_session: A
     user = await get_user_by_username(username_or_email, db_session)
     if not user:
         return False
-    if not Hasher.verify_password(password, user.hashed_password):
+    if not await Hasher.verify_password_async(password, user.hashed_password):
         return False
     return user
+
+
+"""Refresh tokens"""
+
+
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are random 256 bit strings, a plain sha256 is enough to store them"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def issue_refresh_token(user_id: UUID, db_session: AsyncSession, family_id: UUID | None = None) -> str:
+    """Starts a new family unless family_id is given. A new family also drops the user's expired tokens"""
+    if family_id is None:
+        family_id = uuid.uuid4()
+        await db_session.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id,
+                                                            RefreshToken.expires_at <= func.now()))
+    token = secrets.token_urlsafe(32)
+    await db_session.execute(insert(RefreshToken).values(
+        user_id=user_id, family_id=family_id, token_hash=hash_refresh_token(token),
+        expires_at=func.now() + timedelta(days=settings.refresh_token_expire_days)))
+    return token
+
+
+async def rotate_refresh_token(token: str, db_session: AsyncSession) -> tuple[Principal, str] | None:
+    """Uses up the token and issues its successor. A token that was already used has leaked, its family is revoked"""
+    token_hash = hash_refresh_token(token)
+    query = update(RefreshToken) \
+        .where(RefreshToken.token_hash == token_hash, RefreshToken.used_at.is_(None),
+               RefreshToken.expires_at > func.now()) \
+        .values(used_at=func.now()) \
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+    res = await db_session.execute(query)
+    row = res.fetchone()
+    if row is None:
+        used_family = select(RefreshToken.family_id) \
+            .where(RefreshToken.token_hash == token_hash, RefreshToken.used_at.is_not(None)).scalar_subquery()
+        await db_session.execute(delete(RefreshToken).where(RefreshToken.family_id == used_family))
+        await db_session.commit()
+        return
+    user = await get_user_by_id(row.user_id, db_session)
+    new_token = await issue_refresh_token(user.id, db_session, row.family_id)
+    await db_session.commit()
+    return Principal(id=user.id, roles=user.roles, token_version=user.token_version), new_token
+
+
+async def revoke_refresh_token(token: str, everywhere: bool, db_session: AsyncSession):
+    """Revokes the token's family. Everywhere revokes all refresh tokens of the user and bumps the token version,
+    access tokens already issued stay valid for tracker endpoints until they expire. Endpoints that load the user
+    reject them at once on this worker and within principal_cache_ttl_seconds on the others"""
+    token_hash = hash_refresh_token(token)
+    if everywhere:
+        owner = select(RefreshToken.user_id).where(RefreshToken.token_hash == token_hash).scalar_subquery()
+        res = await db_session.execute(update(User).where(User.id == owner)
+                                       .values(token_version=User.token_version + 1).returning(User.id))
+        user_id = res.scalar_one_or_none()
+        if user_id is not None:
+            await db_session.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+            principal_cache.invalidate(user_id)
+    else:
+        family = select(RefreshToken.family_id).where(RefreshToken.token_hash == token_hash).scalar_subquery()
+        await db_session.execute(delete(RefreshToken).where(RefreshToken.family_id == family))
+    await db_session.commit()
@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+from src.config import settings
+
+"""Access token signing and verification.
+
+Keys are parsed once. HS* algorithms sign and verify with settings.secret. EdDSA and ES256 sign with the PEM private key
+from jwt_private_key_path and put its kid (the file name without extension unless jwt_signing_kid is set) in the header.
+Verification picks the public key by kid from jwt_public_keys_dir, where every <kid>.pem is a key. To rotate, add the
+new public key, switch the private key, and remove the old public key once its tokens have expired. An unknown kid
+rescans the directory at most every jwt_keys_reload_seconds.
+
+Verified claims are memoized by token until the token expires, the token string includes its signature.
+"""
+
+SYMMETRIC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+
+
+class TokenVerifier:
+    def __init__(self, algorithm: str, secret: str, private_key_path: str | None, public_keys_dir: str | None,
+                 signing_kid: str | None, cache_size: int, reload_seconds: int):
+        self.algorithm = algorithm
+        self.cache_size = cache_size
+        self.reload_seconds = reload_seconds
+        self.hits = 0
+        self.misses = 0
+        self.public_keys_dir = Path(public_keys_dir) if public_keys_dir else None
+        self._memo: OrderedDict[str, dict] = OrderedDict()
+        self._public_keys: dict[str, object] = {}
+        self._reload_at = 0.0
+        self.signing_kid: str | None = None
+        if algorithm in SYMMETRIC_ALGORITHMS:
+            self._signing_key = self._secret_key = secret.encode()
+            return
+        self._secret_key = None
+        self._signing_key = None
+        if private_key_path:
+            self._signing_key = load_pem_private_key(Path(private_key_path).read_bytes(), password=None)
+            self.signing_kid = signing_kid or Path(private_key_path).stem
+            self._own_public_key = (self.signing_kid, self._signing_key.public_key())
+        else:
+            self._own_public_key = None
+        if self._own_public_key is None and self.public_keys_dir is None:
+            raise ValueError(f"{algorithm} needs jwt_private_key_path or jwt_public_keys_dir")
+        self.load_public_keys()
+
+    def sign(self, claims: dict) -> str:
+        if self._signing_key is None:
+            raise ValueError("No signing key, set jwt_private_key_path")
+        headers = {"kid": self.signing_kid} if self.signing_kid else None
+        return jwt.encode(claims, self._signing_key, algorithm=self.algorithm, headers=headers)
+
+    def verify(self, token: str) -> dict:
+        """Returns the claims or raises jwt.PyJWTError"""
+        claims = self._memo.get(token)
+        if claims is not None:
+            if claims["exp"] > time.time():
+                self._memo.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._memo[token]
+        self.misses += 1
+        claims = jwt.decode(token, self._verification_key(token), algorithms=[self.algorithm],
+                            options={"require": ["exp"]})
+        if self.cache_size > 0:
+            self._memo[token] = claims
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        return claims
+
+    def load_public_keys(self):
+        """Verification keys are the public keys in public_keys_dir and the public half of the signing key.
+        Memoized tokens are dropped, their key may be gone"""
+        keys = {}
+        if self.public_keys_dir is not None:
+            for path in self.public_keys_dir.glob("*.pem"):
+                keys[path.stem] = load_pem_public_key(path.read_bytes())
+        if self._own_public_key is not None:
+            keys.setdefault(*self._own_public_key)
+        self._public_keys = keys
+        self._reload_at = time.monotonic() + self.reload_seconds
+        self._memo.clear()
+
+    def _verification_key(self, token: str):
+        if self._secret_key is not None:
+            return self._secret_key
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._public_keys.get(kid)
+        if key is None and self.public_keys_dir is not None and time.monotonic() >= self._reload_at:
+            self.load_public_keys()
+            key = self._public_keys.get(kid)
+        if key is None:
+            raise jwt.InvalidKeyError(f"Unknown key id {kid!r}")
+        return key
+
+
+token_verifier = TokenVerifier(settings.algorithm, settings.secret,
+                               private_key_path=settings.jwt_private_key_path,
+                               public_keys_dir=settings.jwt_public_keys_dir,
+                               signing_kid=settings.jwt_signing_kid,
+                               cache_size=settings.jwt_verify_cache_size,
+                               reload_seconds=settings.jwt_keys_reload_seconds)
@@ -1,14 +1,20 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import timedelta, datetime
 
-from jose import jwt
 from passlib.context import CryptContext
 
-from src.auth.schemas import UserInDB, Roles
+from src.auth.exceptions import too_many_requests_exception
+from src.auth.schemas import UserInDB, Roles, Principal
+from src.auth.tokens import token_verifier
 from src.config import settings
+from src.metrics import timed_stage
 
 
 class Hasher:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    _executor: Executor | None = None
+    _pending = 0
 
     @staticmethod
     def verify_password(plain_password, hashed_password):
@@ -18,6 +24,41 @@ class Hasher:
     def get_hashed_password(plain_password):
         return Hasher.pwd_context.hash(plain_password)
 
+    @classmethod
+    async def verify_password_async(cls, plain_password, hashed_password) -> bool:
+        return await cls._run_in_pool(cls.verify_password, plain_password, hashed_password)
+
+    @classmethod
+    async def get_hashed_password_async(cls, plain_password) -> str:
+        return await cls._run_in_pool(cls.get_hashed_password, plain_password)
+
+    @classmethod
+    async def _run_in_pool(cls, func, *args):
+        """Bcrypt is CPU bound, so it runs off the event loop. Callers beyond the queue limit get 429"""
+        if cls._pending >= settings.hasher_max_pending:
+            raise too_many_requests_exception
+        cls._pending += 1
+        try:
+            with timed_stage("hash"):
+                return await asyncio.get_running_loop().run_in_executor(cls._get_executor(), func, *args)
+        finally:
+            cls._pending -= 1
+
+    @classmethod
+    def _get_executor(cls) -> Executor:
+        if cls._executor is None:
+            if settings.hasher_executor == "process":
+                cls._executor = ProcessPoolExecutor(max_workers=settings.hasher_workers)
+            else:
+                cls._executor = ThreadPoolExecutor(max_workers=settings.hasher_workers, thread_name_prefix="hasher")
+        return cls._executor
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -26,11 +67,17 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret, algorithm=settings.algorithm)
+    encoded_jwt = token_verifier.sign(to_encode)
     return encoded_jwt
 
 
-def check_access_permissions(current: UserInDB, target: UserInDB) -> bool:
+def create_user_access_token(user: UserInDB | Principal) -> str:
+    """Short-lived token that carries the principal: user id, roles and token version"""
+    return create_access_token(data={"sub": str(user.id), "roles": user.roles, "ver": user.token_version},
+                               expires_delta=timedelta(minutes=settings.access_token_expire_minutes))
+
+
+def check_access_permissions(current: Principal, target: UserInDB) -> bool:
     if current.id == target.id:
         return True
     if Roles.admin in current.roles and Roles.admin in target.roles:
@@ -38,4 +85,3 @@ def check_access_permissions(current: UserInDB, target: UserInDB) -> bool:
     if Roles.admin not in current.roles:
         return False
     return True
-
@@ -1,5 +1,5 @@
 from functools import lru_cache
-from pydantic import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -12,9 +12,59 @@ class Settings(BaseSettings):
 	secret: str
 	algorithm: str
 	access_token_expire_minutes: int
+	refresh_token_expire_days: int = 30
+	jwt_private_key_path: str | None = None
+	jwt_public_keys_dir: str | None = None
+	jwt_signing_kid: str | None = None
+	jwt_keys_reload_seconds: int = 60
+	jwt_verify_cache_size: int = 4096
+	db_echo: bool = False
+	db_pool_size: int = 5
+	db_max_overflow: int = 10
+	db_pool_timeout: int = 30
+	db_pool_recycle: int = 1800
+	db_pool_pre_ping: bool = True
+	db_statement_timeout_ms: int | None = None
+	db_prepared_statement_cache_size: int = 100
+	metrics_allowed_networks: list[str] = ["127.0.0.1/32", "::1/128"]
+	server_timing_enabled: bool = False
+	n_plus_one_threshold: int = 5
+	principal_cache_size: int = 1024
+	principal_cache_ttl_seconds: int = 60
+	hasher_executor: str = "thread"
+	hasher_workers: int = 4
+	hasher_max_pending: int = 64
+	page_default_limit: int | None = None
+	page_max_limit: int = 500
+	search_default_limit: int = 100
+	batch_max_size: int = 500
+	export_chunk_rows: int = 500
+	import_batch_rows: int = 1000
+	import_max_errors: int = 100
+	upcoming_max_window_days: int = 366
+	events_queue_size: int = 100
+	events_ping_seconds: int = 15
+	events_retry_ms: int = 3000
+	reminders_enabled: bool = True
+	reminder_lead_minutes: int = 60
+	reminder_horizon_hours: int = 6
+	reminder_refresh_seconds: int = 300
+	reminder_lock_id: int = 7315001
+	reminder_notifier: str = "log"
+	reminder_webhook_url: str | None = None
+	reminder_webhook_timeout_seconds: float = 5
+	ratelimit_enabled: bool = True
+	# "postgres" takes each token on a second pooled connection, see PostgresStore
+	ratelimit_store: str = "memory"
+	ratelimit_memory_max_keys: int = 100000
+	ratelimit_prune_seconds: int = 600
+	ratelimit_login_ip: str = "30/minute"
+	ratelimit_login_username: str = "10/minute"
+	ratelimit_registration_ip: str = "10/hour"
+	ratelimit_refresh_ip: str = "60/minute"
+	ratelimit_tracker_user: str = "600/minute"
 
-	class Config:
-		env_file = ".env"
+	model_config = SettingsConfigDict(env_file=".env")
 
 
 @lru_cache()
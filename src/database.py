@@ -1,8 +1,13 @@
-from typing import Generator
+import time
+from typing import AsyncGenerator
+from fastapi import Request
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeMeta, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.config import settings
+from src.metrics import metrics, count_query, time_query, count_checkout
 
 
 """Creating DB session and function for DI"""
@@ -11,16 +16,59 @@ DATABASE_URL = f"postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{set
 {settings.db_name}"
 Base: DeclarativeMeta = declarative_base()
 
-engine: AsyncEngine = create_async_engine(DATABASE_URL, future=True, echo=True)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Reports how long callers wait to get a connection out of the pool"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            metrics.observe_pool_wait(time.perf_counter() - started)
+
+
+connect_args = {}
+if settings.db_statement_timeout_ms:
+    connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+
+engine: AsyncEngine = create_async_engine(
+    f"{DATABASE_URL}?prepared_statement_cache_size={settings.db_prepared_statement_cache_size}",
+    future=True,
+    echo=settings.db_echo,
+    poolclass=TimedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args=connect_args,
+)
+metrics.pool = engine.pool
+event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+event.listen(engine.sync_engine, "after_cursor_execute", time_query)
+event.listen(engine.pool, "checkout", count_checkout)
 async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
-"""Global session for all operations"""
+"""One session per request for all operations.
 
+The session is kept on request.state, so every dependency of a request gets the same session even when it is
+resolved with use_cache=False. AsyncSession checks a connection out of the pool only when the first statement runs,
+requests answered without SQL never touch the pool.
+"""
 
-async def get_session() -> Generator:
+
+async def get_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    session: AsyncSession | None = getattr(request.state, "db_session", None)
+    if session is not None:
+        yield session
+        return
+    session = async_session()
+    request.state.db_session = session
     try:
-        session: AsyncSession = async_session()
         yield session
     finally:
+        del request.state.db_session
         await session.close()
@@ -3,3 +3,9 @@ from fastapi import HTTPException, status
 not_found_exception = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
 empty_body_exception = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                      detail="At least one parameter for updating must be passed")
+invalid_cursor_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def rate_limited_exception(retry_after: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests, try again later",
+                         headers={"Retry-After": str(retry_after)})
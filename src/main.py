@@ -1,17 +1,44 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.auth.router import router as auth_router
+from src.auth.utils import Hasher
+from src.config import settings
+from src.metrics import MetricsMiddleware
+from src.metrics import router as metrics_router
 from src.tracker.router import teachers_router as tracker_teachers_router
 from src.tracker.router import subjects_router as tracker_subjects_router
 from src.tracker.router import tasks_router as tracker_tasks_router
+from src.tracker.router import events_router as tracker_events_router
+from src.tracker.router import sync_router as tracker_sync_router
+from src.tracker.router import NEXT_CURSOR_HEADER
+from src.tracker.events import change_broadcaster
+from src.tracker.reminders import reminder_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    change_broadcaster.start()
+    if settings.reminders_enabled:
+        reminder_scheduler.start()
+    yield
+    await reminder_scheduler.stop()
+    await change_broadcaster.stop()
+    Hasher.shutdown()
+
 
 app = FastAPI(title="LabTracker",
-              description="An application for tracking labs, term papers and essays for students")
+              description="An application for tracking labs, term papers and essays for students",
+              lifespan=lifespan)
 app.include_router(auth_router)
 app.include_router(tracker_teachers_router)
 app.include_router(tracker_subjects_router)
 app.include_router(tracker_tasks_router)
+app.include_router(tracker_events_router)
+app.include_router(tracker_sync_router)
+app.include_router(metrics_router)
 
 origins = [
     "http://localhost:5173",
@@ -26,7 +53,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/", status_code=status.HTTP_200_OK)
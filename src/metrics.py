@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from ipaddress import ip_address, ip_network
+from typing import Callable
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.pool import Pool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.auth.cache import principal_cache
+from src.auth.tokens import token_verifier
+from src.config import settings
+from src.exceptions import not_found_exception
+
+"""Process-wide counters exposed in Prometheus text format on /metrics.
+
+Per request the middleware collects the number and duration of SQL statements and the time spent in named stages:
+auth (token verification and the user lookup where one is needed), jwt, hash (bcrypt) and serialize (response_model
+validation and rendering). Stages may overlap, auth includes its SQL. A statement executed n_plus_one_threshold times
+or more within one request marks the request as a likely N+1.
+
+The same figures go to the Server-Timing header when server_timing_enabled is set, and only for clients from
+metrics_allowed_networks. The hash stage is never put in the header: bcrypt runs only for existing usernames, so its
+presence on the login response would reveal which usernames exist.
+"""
+
+logger = logging.getLogger(__name__)
+
+HIDDEN_STAGES = {"hash"}
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.connections = 0
+        self.query_seconds = 0.0
+        self.statements: Counter[str] = Counter()
+        self.stages: defaultdict[str, float] = defaultdict(float)
+        self.endpoint_finished: float | None = None
+
+    def repeated_statement(self) -> tuple[str, int] | None:
+        if not self.statements:
+            return None
+        statement, count = self.statements.most_common(1)[0]
+        if count < settings.n_plus_one_threshold:
+            return None
+        return statement, count
+
+    def server_timing(self, total: float) -> str:
+        entries = [f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()
+                    if stage not in HIDDEN_STAGES]
+        repeated = self.repeated_statement()
+        if repeated is not None:
+            entries.append(f'n-plus-one;desc="statement repeated {repeated[1]}x"')
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+class Metrics:
+    def __init__(self):
+        self.pool: Pool | None = None
+        self.pool_wait_count = 0
+        self.pool_wait_sum = 0.0
+        self.pool_wait_max = 0.0
+        self.requests: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.request_seconds: defaultdict[tuple[str, str], float] = defaultdict(float)
+        self.queries: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.query_seconds: defaultdict[tuple[str, str], float] = defaultdict(float)
+        self.connections: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.n_plus_one: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.stage_seconds: defaultdict[tuple[str, str, str], float] = defaultdict(float)
+        self.rate_limited: defaultdict[str, int] = defaultdict(int)
+
+    def observe_pool_wait(self, seconds: float):
+        self.pool_wait_count += 1
+        self.pool_wait_sum += seconds
+        self.pool_wait_max = max(self.pool_wait_max, seconds)
+
+    def observe_request(self, method: str, route: str, stats: RequestStats, seconds: float):
+        self.requests[(method, route)] += 1
+        self.request_seconds[(method, route)] += seconds
+        self.queries[(method, route)] += stats.queries
+        self.query_seconds[(method, route)] += stats.query_seconds
+        self.connections[(method, route)] += stats.connections
+        for stage, stage_seconds in stats.stages.items():
+            self.stage_seconds[(method, route, stage)] += stage_seconds
+        repeated = stats.repeated_statement()
+        if repeated is not None:
+            self.n_plus_one[(method, route)] += 1
+            logger.warning("Possible N+1 in %s %s, statement executed %d times: %.200s", method, route,
+                           repeated[1], repeated[0])
+
+    def render(self) -> str:
+        lines = []
+        if self.pool is not None:
+            lines += [
+                "# TYPE labtracker_db_pool_size gauge",
+                f"labtracker_db_pool_size {self.pool.size()}",
+                "# TYPE labtracker_db_pool_checked_out gauge",
+                f"labtracker_db_pool_checked_out {self.pool.checkedout()}",
+                "# TYPE labtracker_db_pool_overflow gauge",
+                f"labtracker_db_pool_overflow {self.pool.overflow()}",
+            ]
+        lines += [
+            "# TYPE labtracker_db_pool_wait_seconds summary",
+            f"labtracker_db_pool_wait_seconds_count {self.pool_wait_count}",
+            f"labtracker_db_pool_wait_seconds_sum {self.pool_wait_sum:.6f}",
+            "# TYPE labtracker_db_pool_wait_seconds_max gauge",
+            f"labtracker_db_pool_wait_seconds_max {self.pool_wait_max:.6f}",
+            "# TYPE labtracker_principal_cache_hits_total counter",
+            f"labtracker_principal_cache_hits_total {principal_cache.hits}",
+            "# TYPE labtracker_principal_cache_misses_total counter",
+            f"labtracker_principal_cache_misses_total {principal_cache.misses}",
+            "# TYPE labtracker_token_cache_hits_total counter",
+            f"labtracker_token_cache_hits_total {token_verifier.hits}",
+            "# TYPE labtracker_token_cache_misses_total counter",
+            f"labtracker_token_cache_misses_total {token_verifier.misses}",
+        ]
+        lines += self._route_counter("labtracker_http_requests_total", self.requests)
+        lines += self._route_counter("labtracker_http_request_seconds_total", self.request_seconds)
+        lines += self._route_counter("labtracker_db_queries_total", self.queries)
+        lines += self._route_counter("labtracker_db_query_seconds_total", self.query_seconds)
+        lines += self._route_counter("labtracker_db_connections_checked_out_total", self.connections)
+        lines += self._route_counter("labtracker_n_plus_one_requests_total", self.n_plus_one)
+        lines.append("# TYPE labtracker_stage_seconds_total counter")
+        lines += [f'labtracker_stage_seconds_total{{method="{method}",route="{route}",stage="{stage}"}} {value:.6f}'
+                  for (method, route, stage), value in sorted(self.stage_seconds.items())]
+        lines.append("# TYPE labtracker_rate_limited_total counter")
+        lines += [f'labtracker_rate_limited_total{{limit="{limit}"}} {count}'
+                  for limit, count in sorted(self.rate_limited.items())]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _route_counter(name: str, values: dict[tuple[str, str], int | float]) -> list[str]:
+        return [f"# TYPE {name} counter"] + [
+            f'{name}{{method="{method}",route="{route}"}} {value if isinstance(value, int) else f"{value:.6f}"}'
+            for (method, route), value in sorted(values.items())]
+
+
+metrics = Metrics()
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """before_cursor_execute listener"""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.statements[statement] += 1
+        conn.info["query_started"] = time.perf_counter()
+
+
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    """after_cursor_execute listener"""
+    started = conn.info.pop("query_started", None)
+    stats = request_stats.get()
+    if stats is not None and started is not None:
+        stats.query_seconds += time.perf_counter() - started
+
+
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    """Pool checkout listener"""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.connections += 1
+
+
+@contextmanager
+def timed_stage(stage: str):
+    stats = request_stats.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.stages[stage] += time.perf_counter() - started
+
+
+def mark_endpoint_finished(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            stats = request_stats.get()
+            if stats is not None:
+                stats.endpoint_finished = time.perf_counter()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Everything the route handler does after the endpoint returned is response serialization. Endpoints that encode
+    the response themselves (src.serialization) add their encoding to the serialize stage with timed_stage"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = mark_endpoint_finished(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            response = await handler(request)
+            stats = request_stats.get()
+            if stats is not None and stats.endpoint_finished is not None:
+                stats.stages["serialize"] += time.perf_counter() - stats.endpoint_finished
+            return response
+        return profiled_handler
+
+
+metrics_networks = [ip_network(network) for network in settings.metrics_allowed_networks]
+
+
+def is_metrics_client(client: tuple[str, int] | None) -> bool:
+    """Whether the client address is in metrics_allowed_networks"""
+    if client is None:
+        return False
+    try:
+        return any(ip_address(client[0]) in network for network in metrics_networks)
+    except ValueError:
+        return False
+
+
+class MetricsMiddleware:
+    """Counts requests, SQL statements and stage timings per route template and reports them in Server-Timing"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        server_timing = settings.server_timing_enabled and is_metrics_client(scope.get("client"))
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start" and server_timing:
+                MutableHeaders(scope=message).append("Server-Timing",
+                                                     stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            route = scope.get("route")
+            metrics.observe_request(scope["method"], getattr(route, "path", "unmatched"), stats,
+                                    time.perf_counter() - started)
+
+
+async def check_metrics_access(request: Request):
+    """Only scrapers from metrics_allowed_networks see /metrics, for anyone else it does not exist"""
+    if not is_metrics_client(request.scope.get("client")):
+        raise not_found_exception
+
+
+router = APIRouter(tags=["metrics"], route_class=ProfiledRoute)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False,
+            dependencies=[Depends(check_metrics_access)])
+async def read_metrics():
+    return metrics.render()
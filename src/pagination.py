@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable
+from uuid import UUID
+
+from sqlalchemy import ColumnElement, and_, or_, desc as sql_desc
+
+from src.exceptions import invalid_cursor_exception
+
+"""Keyset pagination helpers.
+
+Rows are ordered by (sort expression, id). Postgres puts NULLs last for ASC and first for DESC,
+the predicates below follow the same rules so nullable sort columns page correctly.
+Without a limit every remaining row is returned and there is no next page.
+"""
+
+
+def encode_cursor(sort: str | None, descending: bool, value: Any, last_id: UUID) -> str:
+    payload = {"s": sort, "d": descending, "id": str(last_id), "v": value}
+    if isinstance(value, datetime):
+        payload["v"] = value.isoformat()
+        payload["t"] = "dt"
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sort: str | None, descending: bool,
+                  sort_expr: ColumnElement | None) -> tuple[Any, UUID]:
+    """Returns (sort value, id) of the last row of the previous page. The value must have the Python type of the sort
+    expression, so a tampered cursor is rejected here instead of failing in the driver"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != sort or payload["d"] != descending:
+            raise invalid_cursor_exception
+        value = payload["v"]
+        if payload.get("t") == "dt":
+            value = datetime.fromisoformat(value)
+        if value is not None and (sort_expr is None or type(value) is not sort_expr.type.python_type):
+            raise invalid_cursor_exception
+        return value, UUID(payload["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError, NotImplementedError):
+        raise invalid_cursor_exception
+
+
+def keyset_condition(sort_expr: ColumnElement | None, value: Any, id_column: ColumnElement, last_id: UUID,
+                     descending: bool) -> ColumnElement:
+    """Condition selecting rows strictly after (value, last_id) in keyset order"""
+    id_after = id_column < last_id if descending else id_column > last_id
+    if sort_expr is None:
+        return id_after
+    if descending:
+        if value is None:
+            return or_(and_(sort_expr.is_(None), id_after), sort_expr.is_not(None))
+        return or_(sort_expr < value, and_(sort_expr == value, id_after))
+    if value is None:
+        return and_(sort_expr.is_(None), id_after)
+    return or_(sort_expr > value, and_(sort_expr == value, id_after), sort_expr.is_(None))
+
+
+def keyset_order(sort_expr: ColumnElement | None, id_column: ColumnElement, descending: bool) -> list:
+    columns = [id_column] if sort_expr is None else [sort_expr, id_column]
+    if descending:
+        return [sql_desc(column) for column in columns]
+    return columns
+
+
+def fetch_limit(limit: int | None) -> int | None:
+    """One extra row tells whether there is a next page"""
+    return limit + 1 if limit is not None else None
+
+
+def paginate(rows: list, sort: str | None, descending: bool, limit: int | None,
+             sort_value: Callable[[Any], Any]) -> tuple[list, str | None]:
+    """Cuts the extra row fetched with limit + 1 and builds the cursor of the next page"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, descending, sort_value(rows[-1]), rows[-1].id)
@@ -0,0 +1,153 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Annotated
+
+from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.auth.dependencies import get_current_principal
+from src.auth.models import RateLimitBucket
+from src.auth.schemas import Principal
+from src.config import settings
+from src.database import engine
+from src.exceptions import rate_limited_exception
+from src.metrics import metrics
+
+"""Rate limiting.
+
+Every limit is a token bucket per key: it holds up to capacity tokens, refills at capacity per period and each request
+takes one token. Buckets live in the memory of the worker, or in Postgres when all workers must share them.
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Limit:
+    name: str
+    capacity: int
+    period: int
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, name: str, value: str) -> "Limit":
+        """'10/minute' allows bursts of 10 requests and gives a token back every 6 seconds"""
+        capacity, _, period = value.partition("/")
+        return cls(name, int(capacity), PERIODS[period.strip()])
+
+
+login_ip_limit = Limit.parse("login_ip", settings.ratelimit_login_ip)
+login_username_limit = Limit.parse("login_username", settings.ratelimit_login_username)
+registration_ip_limit = Limit.parse("registration_ip", settings.ratelimit_registration_ip)
+refresh_ip_limit = Limit.parse("refresh_ip", settings.ratelimit_refresh_ip)
+tracker_user_limit = Limit.parse("tracker_user", settings.ratelimit_tracker_user)
+LIMITS = (login_ip_limit, login_username_limit, registration_ip_limit, refresh_ip_limit, tracker_user_limit)
+
+
+class MemoryStore:
+    """Buckets of this worker in LRU order, the least recently used are dropped beyond max_keys"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        """Returns 0 when a token was taken, otherwise the seconds until the next one"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / limit.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class PostgresStore:
+    """One upsert per request, the token is taken only if the refilled bucket has one. A bucket idle longer than its
+    period is full again, so such rows are deleted every prune_seconds.
+
+    The upsert commits on a connection of its own, so a limited request checks out a second pooled connection for the
+    length of one short transaction. The bucket row stays locked only for that transaction instead of the whole
+    request, and a request that rolls back still uses up its token. Size db_pool_size for it"""
+
+    def __init__(self, prune_seconds: int, max_idle: timedelta):
+        self.prune_seconds = prune_seconds
+        self.max_idle = max_idle
+        self._prune_at = 0.0
+
+    async def take(self, key: str, limit: Limit) -> float:
+        refilled = func.least(limit.capacity, RateLimitBucket.tokens +
+                              func.extract("epoch", func.now() - RateLimitBucket.updated_at) * limit.rate)
+        query = pg_insert(RateLimitBucket).values(key=key, tokens=limit.capacity - 1, updated_at=func.now()) \
+            .on_conflict_do_update(index_elements=[RateLimitBucket.key],
+                                   set_={"tokens": refilled - 1, "updated_at": func.now()},
+                                   where=refilled >= 1) \
+            .returning(RateLimitBucket.tokens)
+        async with engine.begin() as connection:
+            if time.monotonic() >= self._prune_at:
+                self._prune_at = time.monotonic() + self.prune_seconds
+                await connection.execute(delete(RateLimitBucket)
+                                         .where(RateLimitBucket.updated_at < func.now() - self.max_idle))
+            res = await connection.execute(query)
+            if res.first() is not None:
+                return 0.0
+            res = await connection.execute(select((1 - refilled) / limit.rate).where(RateLimitBucket.key == key))
+            return float(res.scalar_one())
+
+
+def get_store() -> MemoryStore | PostgresStore:
+    if settings.ratelimit_store == "postgres":
+        return PostgresStore(settings.ratelimit_prune_seconds,
+                             max_idle=timedelta(seconds=max(limit.period for limit in LIMITS)))
+    return MemoryStore(settings.ratelimit_memory_max_keys)
+
+
+store = get_store()
+
+
+async def check_limit(limit: Limit, key: str):
+    if not settings.ratelimit_enabled:
+        return
+    wait = await store.take(f"{limit.name}:{key}", limit)
+    if wait > 0:
+        metrics.rate_limited[limit.name] += 1
+        raise rate_limited_exception(math.ceil(wait))
+
+
+def client_ip(request: Request) -> str:
+    """Behind a proxy run uvicorn with --proxy-headers, so the client is the address from X-Forwarded-For"""
+    return request.client.host if request.client is not None else "unknown"
+
+
+"""Dependencies"""
+
+
+async def limit_login(request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+    await check_limit(login_ip_limit, client_ip(request))
+    await check_limit(login_username_limit, form_data.username.lower())
+
+
+async def limit_registration(request: Request):
+    await check_limit(registration_ip_limit, client_ip(request))
+
+
+async def limit_refresh(request: Request):
+    await check_limit(refresh_ip_limit, client_ip(request))
+
+
+async def limit_tracker(principal: Annotated[Principal, Depends(get_current_principal)]):
+    await check_limit(tracker_user_limit, str(principal.id))
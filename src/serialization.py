@@ -0,0 +1,37 @@
+import json
+from datetime import date, datetime
+from typing import Any, Mapping
+from uuid import UUID
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from src.metrics import timed_stage
+
+"""Direct JSON encoding of responses. Plain dicts skip response_model validation, models and model lists are validated
+and encoded by their compiled TypeAdapter. Encoding runs inside the endpoint, so it is timed here as the serialize stage"""
+
+
+def json_default(value: Any):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content: Any) -> bytes:
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_bytes_response(content: Any, headers: Mapping[str, str] | None = None) -> Response:
+    with timed_stage("serialize"):
+        return Response(content=dump_json(content), media_type="application/json", headers=headers)
+
+
+def model_response(adapter: TypeAdapter, content: Any, headers: Mapping[str, str] | None = None) -> Response:
+    """Validates ORM objects or dicts against the adapter and encodes the result to JSON in pydantic-core, without
+    FastAPI's intermediate dump to Python objects"""
+    with timed_stage("serialize"):
+        return Response(content=adapter.dump_json(adapter.validate_python(content, from_attributes=True)),
+                        media_type="application/json", headers=headers)
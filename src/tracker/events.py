@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Callable
+from uuid import UUID
+
+from src.config import settings
+from src.database import engine
+from src.tracker.service import CHANGES_CHANNEL
+
+"""Change feed.
+
+Every worker LISTENs on CHANGES_CHANNEL with one connection and fans the changes out to the queues of the subscribed
+users. Queues are bounded: a subscriber that falls behind loses its backlog and gets a resync event instead, as do
+all subscribers after the listener connection was lost.
+"""
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {"entity": None, "action": "resync"}
+
+
+class ChangeBroadcaster:
+    def __init__(self, queue_size: int, retry_seconds: float):
+        self.queue_size = queue_size
+        self.retry_seconds = retry_seconds
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._listeners: list[Callable[[dict], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Listeners get the changes of all users"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]):
+        self._listeners.remove(listener)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: UUID) -> AsyncIterator[asyncio.Queue]:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscribers = self._subscribers[str(user_id)]
+        subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(str(user_id), None)
+
+    async def _run(self):
+        """The LISTEN connection is thrown away afterwards instead of going back to the pool still listening"""
+        reconnect = False
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    driver_connection = (await connection.get_raw_connection()).driver_connection
+                    try:
+                        await driver_connection.add_listener(CHANGES_CHANNEL, self._on_notify)
+                        if reconnect:
+                            for subscribers in self._subscribers.values():
+                                for queue in subscribers:
+                                    self._put(queue, RESYNC)
+                        reconnect = True
+                        while not driver_connection.is_closed():
+                            await asyncio.sleep(self.retry_seconds)
+                    finally:
+                        await connection.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change listener failed")
+            await asyncio.sleep(self.retry_seconds)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        change = json.loads(payload)
+        for listener in self._listeners:
+            listener(change)
+        for queue in self._subscribers.get(change["user_id"], ()):
+            self._put(queue, change)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, change: dict):
+        try:
+            queue.put_nowait(change)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+
+
+def format_event(change: dict) -> bytes:
+    if change is RESYNC:
+        return b"event: resync\ndata: {}\n\n"
+    return f"id: {change['revision']}\nevent: {change['entity']}.{change['action']}\n" \
+           f"data: {json.dumps(change, separators=(',', ':'))}\n\n".encode()
+
+
+async def stream_changes(user_id: UUID) -> AsyncIterator[bytes]:
+    """SSE stream of the user's changes with a comment every events_ping_seconds to keep proxies from closing it"""
+    async with change_broadcaster.subscribe(user_id) as queue:
+        yield f"retry: {settings.events_retry_ms}\n\n".encode()
+        while True:
+            try:
+                change = await asyncio.wait_for(queue.get(), settings.events_ping_seconds)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield format_event(change)
+
+
+change_broadcaster = ChangeBroadcaster(queue_size=settings.events_queue_size,
+                                       retry_seconds=settings.events_retry_ms / 1000)
@@ -1,3 +1,12 @@
 from fastapi import HTTPException, status
 
-not_enough_permissions_exception = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
\ No newline at end of file
+from src.config import settings
+
+not_enough_permissions_exception = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+duplicate_batch_ids_exception = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                              detail="Batch contains duplicate ids")
+invalid_window_exception = HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                         detail="Window must be positive and not longer than "
+                                                f"{settings.upcoming_max_window_days} days")
+invalid_import_file_exception = HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                              detail="Import file is not valid UTF-8 CSV or NDJSON")
@@ -1,7 +1,9 @@
 import uuid
 
-from sqlalchemy import String, TIMESTAMP, Column, UUID, MetaData, Text, ForeignKey, SmallInteger, Boolean, Integer
-from sqlalchemy.orm import relationship, ColumnProperty
+from sqlalchemy import (String, TIMESTAMP, Column, UUID, MetaData, Text, ForeignKey, SmallInteger, Boolean, Integer,
+                        Computed, Index, BigInteger, text, func)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, ColumnProperty, deferred
 
 from src.auth.models import User
 from src.database import Base
@@ -10,6 +12,11 @@ from src.database import Base
 
 metadata = MetaData()
 
+PRIORITY_RANK_SQL = "CASE priority WHEN 'Low' THEN 1 WHEN 'Medium' THEN 2 WHEN 'High' THEN 3 END"
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR_SQL = (f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+                     f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')")
+
 
 class Task(Base):
     __tablename__ = 'tasks'
@@ -22,10 +29,28 @@ class Task(Base):
     type = Column(String, default=None)
     priority = Column(String, default="Low")
     status = Column(Boolean, default=False)
+    priority_rank = Column(SmallInteger, Computed(PRIORITY_RANK_SQL, persisted=True))
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete='CASCADE', ), nullable=False)
     subject_id = Column(UUID(as_uuid=True), ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    revision = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     subject = relationship("Subject", back_populates="tasks", lazy="selectin")
 
+    __table_args__ = (
+        Index('ix_tasks_user_id_deadline', 'user_id', 'deadline', 'id'),
+        Index('ix_tasks_user_id_priority_rank', 'user_id', 'priority_rank', 'id'),
+        Index('ix_tasks_user_id_name', 'user_id', 'name', 'id'),
+        Index('ix_tasks_user_id_type', 'user_id', 'type', 'id'),
+        Index('ix_tasks_user_id_status', 'user_id', 'status', 'id'),
+        Index('ix_tasks_user_id_deadline_open', 'user_id', 'deadline', 'id', postgresql_where=text('status = false')),
+        Index('ix_tasks_deadline_open', 'deadline', postgresql_where=text('status = false')),
+        Index('ix_tasks_subject_id', 'subject_id'),
+        Index('ix_tasks_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_tasks_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_tasks_user_id_revision', 'user_id', 'revision'),
+    )
+
 
 class Teacher(Base):
     __tablename__ = 'teachers'
@@ -37,8 +62,17 @@ class Teacher(Base):
     father_name = Column(String(length=100), nullable=True, default=None)
     phone_number = Column(Text, default=None)
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete='CASCADE'), nullable=False)
+    revision = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     subjects = relationship("Subject", back_populates="teacher")
 
+    __table_args__ = (
+        Index('ix_teachers_user_id_name', 'user_id', 'name', 'id'),
+        Index('ix_teachers_user_id_surname', 'user_id', 'surname', 'id'),
+        Index('ix_teachers_user_id_father_name', 'user_id', 'father_name', 'id'),
+        Index('ix_teachers_user_id_revision', 'user_id', 'revision'),
+    )
+
 
 class Subject(Base):
     __tablename__ = 'subjects'
@@ -49,5 +83,38 @@ class Subject(Base):
     course = Column(SmallInteger, default=None)
     teacher_id = Column(UUID(as_uuid=True), ForeignKey('teachers.id', ondelete='SET NULL'))
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete='CASCADE'), nullable=False)
+    revision = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     teacher = relationship("Teacher", back_populates="subjects", lazy="selectin")
-    tasks = relationship("Task", back_populates="subject", lazy="selectin")
+    tasks = relationship("Task", back_populates="subject", lazy="raise")
+
+    __table_args__ = (
+        Index('ix_subjects_user_id_name', 'user_id', 'name', 'id'),
+        Index('ix_subjects_user_id_course', 'user_id', 'course', 'id'),
+        Index('ix_subjects_teacher_id', 'teacher_id'),
+        Index('ix_subjects_user_id_revision', 'user_id', 'revision'),
+    )
+
+
+class Revision(Base):
+    """Per-user counter bumped by every change of the user's teachers, subjects or tasks"""
+    __tablename__ = 'tracker_revisions'
+    metadata = metadata
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete='CASCADE'), primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=0)
+
+
+class Tombstone(Base):
+    """Deleted teacher, subject or task, stamped with the revision of the deletion for incremental sync"""
+    __tablename__ = 'tracker_tombstones'
+    metadata = metadata
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey(User.id, ondelete='CASCADE'), primary_key=True)
+    entity = Column(String, primary_key=True)
+    entity_id = Column(UUID(as_uuid=True), primary_key=True)
+    revision = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index('ix_tracker_tombstones_user_id_revision', 'user_id', 'revision'),
+    )
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import logging
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import select, false, any_, or_
+
+from src.config import settings
+from src.database import engine, async_session
+from src.serialization import dump_json
+from src.tracker.models import Task as TaskDB
+from src.tracker.events import change_broadcaster
+from src.tracker.schemas import TrackerEntities, ChangeActions
+from src.tracker.service import ids_array
+
+"""Deadline reminders.
+
+One worker of the deployment holds a Postgres advisory lock and schedules a reminder reminder_lead_minutes before
+the deadline of every open task. Reminders of the next reminder_horizon_hours are kept in a min-heap, task changes
+arrive from the change feed and the whole horizon is reloaded every reminder_refresh_seconds.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Reminder:
+    task_id: UUID
+    user_id: UUID
+    name: str
+    deadline: datetime
+    remind_at: datetime
+
+
+class Notifier(ABC):
+    @abstractmethod
+    async def notify(self, reminder: Reminder):
+        """Delivers one reminder, errors are logged by the scheduler"""
+
+
+class LogNotifier(Notifier):
+    async def notify(self, reminder: Reminder):
+        logger.info("Task %s '%s' of user %s is due at %s", reminder.task_id, reminder.name, reminder.user_id,
+                    reminder.deadline.isoformat())
+
+
+class WebhookNotifier(Notifier):
+    """POSTs the reminder as JSON. urllib blocks, so the request runs in a thread"""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    async def notify(self, reminder: Reminder):
+        request = urllib.request.Request(self.url, data=dump_json(asdict(reminder)), method="POST",
+                                         headers={"Content-Type": "application/json"})
+        await asyncio.to_thread(self._send, request)
+
+    def _send(self, request: urllib.request.Request):
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def get_notifier() -> Notifier:
+    if settings.reminder_notifier == "webhook":
+        return WebhookNotifier(settings.reminder_webhook_url, settings.reminder_webhook_timeout_seconds)
+    return LogNotifier()
+
+
+class ReminderScheduler:
+    def __init__(self, notifier: Notifier, lead: timedelta, horizon: timedelta, refresh_seconds: float,
+                 lock_id: int):
+        self.notifier = notifier
+        self.lead = lead
+        self.horizon = horizon
+        self.refresh_seconds = refresh_seconds
+        self.lock_id = lock_id
+        self.is_leader = False
+        self._heap: list[tuple[datetime, UUID]] = []
+        self._scheduled: dict[UUID, Reminder] = {}
+        self._sent: dict[UUID, datetime] = {}
+        self._changes: list[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self):
+        """Tries to take the lock every refresh_seconds. The lock is held by the session of a dedicated connection,
+        which is thrown away afterwards, so a dead leader always releases it"""
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    driver_connection = (await connection.get_raw_connection()).driver_connection
+                    if await driver_connection.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_id):
+                        try:
+                            await self._lead(driver_connection)
+                        finally:
+                            self.is_leader = False
+                            await connection.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler failed")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def _lead(self, driver_connection):
+        self.is_leader = True
+        logger.info("Reminder scheduler took the lead")
+        change_broadcaster.add_listener(self._on_change)
+        try:
+            await self._schedule(driver_connection)
+        finally:
+            change_broadcaster.remove_listener(self._on_change)
+
+    async def _schedule(self, driver_connection):
+        loop = asyncio.get_running_loop()
+        reload_at = loop.time()
+        while not driver_connection.is_closed():
+            if loop.time() >= reload_at:
+                await self._reload()
+                reload_at = loop.time() + self.refresh_seconds
+            elif self._changes:
+                await self._apply_changes()
+            await self._dispatch_due()
+
+            self._wakeup.clear()
+            if self._changes:
+                continue
+            timeout = reload_at - loop.time()
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds())
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+
+    def _on_change(self, change: dict):
+        """Deleting a subject deletes its tasks too"""
+        if change["entity"] == TrackerEntities.task or \
+                (change["entity"] == TrackerEntities.subject and change["action"] == ChangeActions.deleted):
+            self._changes.append(change)
+            self._wakeup.set()
+
+    async def _reload(self):
+        """Rebuilds the heap. Reminders already due are left out, the previous leader may have sent them"""
+        self._changes.clear()
+        self._heap = []
+        self._scheduled = {}
+        now = datetime.now(timezone.utc)
+        self._sent = {task_id: deadline for task_id, deadline in self._sent.items() if deadline > now}
+        await self._load(include_due=False)
+
+    async def _apply_changes(self):
+        """Reschedules changed tasks. A task whose reminder time has passed but not its deadline is reminded now"""
+        changes, self._changes = self._changes, []
+        task_ids, user_ids = set(), set()
+        for change in changes:
+            if change["entity"] == TrackerEntities.task and change["ids"] is not None:
+                task_ids.update(UUID(task_id) for task_id in change["ids"])
+            else:
+                user_ids.add(UUID(change["user_id"]))
+        for task_id in task_ids:
+            self._scheduled.pop(task_id, None)
+        if user_ids:
+            self._scheduled = {task_id: reminder for task_id, reminder in self._scheduled.items()
+                               if reminder.user_id not in user_ids}
+        conditions = []
+        if task_ids:
+            conditions.append(TaskDB.id == any_(ids_array('task_ids', task_ids)))
+        if user_ids:
+            conditions.append(TaskDB.user_id == any_(ids_array('user_ids', user_ids)))
+        await self._load(or_(*conditions), include_due=True)
+
+    async def _load(self, *conditions, include_due: bool):
+        now = datetime.now(timezone.utc)
+        query = select(TaskDB.id, TaskDB.user_id, TaskDB.name, TaskDB.deadline) \
+            .where(TaskDB.status == false(),
+                   TaskDB.deadline > (now if include_due else now + self.lead),
+                   TaskDB.deadline <= now + self.lead + self.horizon,
+                   *conditions)
+        async with async_session() as db_session:
+            res = await db_session.execute(query)
+        for row in res:
+            if self._sent.get(row.id) == row.deadline:
+                continue
+            reminder = Reminder(task_id=row.id, user_id=row.user_id, name=row.name, deadline=row.deadline,
+                                remind_at=row.deadline - self.lead)
+            self._scheduled[reminder.task_id] = reminder
+            heapq.heappush(self._heap, (reminder.remind_at, reminder.task_id))
+
+    async def _dispatch_due(self):
+        """Heap entries of rescheduled or removed tasks are stale and skipped"""
+        now = datetime.now(timezone.utc)
+        while self._heap and self._heap[0][0] <= now:
+            remind_at, task_id = heapq.heappop(self._heap)
+            reminder = self._scheduled.get(task_id)
+            if reminder is None or reminder.remind_at != remind_at:
+                continue
+            del self._scheduled[task_id]
+            self._sent[task_id] = reminder.deadline
+            try:
+                await self.notifier.notify(reminder)
+            except Exception:
+                logger.exception("Reminder for task %s was not delivered", task_id)
+
+
+reminder_scheduler = ReminderScheduler(get_notifier(),
+                                       lead=timedelta(minutes=settings.reminder_lead_minutes),
+                                       horizon=timedelta(hours=settings.reminder_horizon_hours),
+                                       refresh_seconds=settings.reminder_refresh_seconds,
+                                       lock_id=settings.reminder_lock_id)
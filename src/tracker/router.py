@@ -1,59 +1,105 @@
+from datetime import timedelta
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response, Body, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.dependencies import get_current_user as auth_get_current_user
-from src.auth.schemas import UserInDB
+from src.auth.dependencies import get_current_principal as auth_get_current_principal
+from src.auth.schemas import Principal
+from src.config import settings
 from src.database import get_session
 from src.exceptions import not_found_exception, empty_body_exception
-from src.tracker.dependencies import (check_teacher_id, check_access_to_teachers, check_subject_id,
-                                      check_access_to_subjects, check_task_id, check_access_to_tasks)
+from src.metrics import ProfiledRoute
+from src.ratelimit import limit_tracker
+from src.serialization import json_bytes_response, model_response
+from src.tracker.dependencies import check_teacher_id, check_subject_id, check_task_id, check_etag
+from src.tracker.events import stream_changes
+from src.tracker.exceptions import duplicate_batch_ids_exception, invalid_window_exception
+from src.tracker.models import Subject as SubjectDB
+from src.tracker.models import Task as TaskDB
+from src.tracker.models import Teacher as TeacherDB
 from src.tracker.schemas import (TeacherResponse, CreateTeacher, DeleteTeacher, SubjectResponse, CreateSubject,
                                  DeleteSubject, UpdateSubject, UpdateSubjectRequest, CreateTask, TaskResponse,
-                                 DeleteTask, UpdateTaskRequest,
+                                 DeleteTask, UpdateTaskRequest, SubjectSummaryResponse, TaskStatsResponse,
+                                 BatchUpdateTask, BatchTasksResponse, FileFormats, ImportTeacher,
+                                 ImportSubject, ImportTask, ImportResponse, SyncResponse,
                                  UpdateTask, Teacher, Subject, Task, TeacherSorts, SubjectSorts, TaskSorts, Priority,
-                                 TasksTypes)
+                                 TasksTypes, TeacherResponseList, SubjectResponseList, SubjectSummaryResponseList,
+                                 TaskResponseList, SyncResponseAdapter)
 from src.tracker.service import (get_teachers_by_user_id, create_teacher_by_user_id,
                                  delete_teacher_by_id, create_subject_by_user_id, get_subjects_by_user_id,
-                                 delete_subject_by_id,
+                                 get_subjects_summary_by_user_id, delete_subject_by_id,
                                  update_subject_by_id, create_task_by_user_id, get_tasks_by_user_id, delete_task_by_id,
-                                 update_task_by_id)
-
-teachers_router = APIRouter(prefix="/teachers", tags=["teachers"])
-subjects_router = APIRouter(prefix="/subjects", tags=["subjects"])
-tasks_router = APIRouter(prefix="/tasks", tags=["tasks"])
+                                 update_task_by_id, get_tasks_stats_by_user_id, create_tasks_batch, update_tasks_batch,
+                                 delete_tasks_batch, get_task_rows_by_user_id, get_subject_rows_by_user_id,
+                                 export_tasks_by_user_id, import_by_user_id, search_tasks_by_user_id,
+                                 get_upcoming_tasks_by_user_id, get_changes_by_user_id)
+
+teachers_router = APIRouter(prefix="/teachers", tags=["teachers"], route_class=ProfiledRoute,
+                            dependencies=[Depends(limit_tracker)])
+subjects_router = APIRouter(prefix="/subjects", tags=["subjects"], route_class=ProfiledRoute,
+                            dependencies=[Depends(limit_tracker)])
+tasks_router = APIRouter(prefix="/tasks", tags=["tasks"], route_class=ProfiledRoute,
+                         dependencies=[Depends(limit_tracker)])
+events_router = APIRouter(prefix="/events", tags=["events"], route_class=ProfiledRoute,
+                          dependencies=[Depends(limit_tracker)])
+sync_router = APIRouter(prefix="/sync", tags=["sync"], route_class=ProfiledRoute,
+                        dependencies=[Depends(limit_tracker)])
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+PageLimit = Annotated[int | None, Query(gt=0, le=settings.page_max_limit)]
+FileFormat = Annotated[FileFormats, Query(alias="format")]
+
+check_revision_etag = check_etag()
+check_time_sensitive_etag = check_etag(bucket_seconds=60)
 
 """Teachers CRUD"""
 
 
-@teachers_router.get("/{teacher_id}", response_model=TeacherResponse, dependencies=[Depends(check_access_to_teachers)])
+@teachers_router.get("/{teacher_id}", response_model=TeacherResponse, dependencies=[Depends(check_revision_etag)])
 async def get_teacher(teacher: Annotated[Teacher, Depends(check_teacher_id)]):
     return teacher
 
 
-@teachers_router.get("/", response_model=list[TeacherResponse])
+@teachers_router.get("/", response_model=list[TeacherResponse], dependencies=[Depends(check_revision_etag)])
 async def get_all_teachers(session: Annotated[AsyncSession, Depends(get_session)],
-                           current_user: Annotated[UserInDB, Depends(auth_get_current_user)],
+                           current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                           response: Response,
                            sort: Annotated[TeacherSorts | None, Query()] = None,
-                           desc: Annotated[bool, Query()] = False):
-    teachers = await get_teachers_by_user_id(current_user.id, sort, desc, session)
+                           desc: Annotated[bool, Query()] = False,
+                           cursor: Annotated[str | None, Query()] = None,
+                           limit: PageLimit = settings.page_default_limit):
+    teachers, next_cursor = await get_teachers_by_user_id(current_user.id, sort, desc, cursor, limit, session)
     if not teachers:
         raise not_found_exception
-    return teachers
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return model_response(TeacherResponseList, teachers, response.headers)
 
 
 @teachers_router.post("/", response_model=TeacherResponse)
 async def create_teacher(teacher: CreateTeacher, session: Annotated[AsyncSession, Depends(get_session)],
-                         current_user: Annotated[UserInDB, Depends(auth_get_current_user)]):
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
     created_teacher = await create_teacher_by_user_id(current_user.id, teacher, session)
     return created_teacher
 
 
-@teachers_router.delete("/{teacher_id}", response_model=DeleteTeacher, dependencies=[Depends(check_access_to_teachers)])
-async def delete_teacher(teacher_id: UUID, session: Annotated[AsyncSession, Depends(get_session)]):
-    deleted_teacher = await delete_teacher_by_id(teacher_id, session)
+@teachers_router.post("/import", response_model=ImportResponse)
+async def import_teachers(file: UploadFile, session: Annotated[AsyncSession, Depends(get_session)],
+                          current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                          import_format: FileFormat = FileFormats.ndjson):
+    return await import_by_user_id(current_user.id, TeacherDB, ImportTeacher, file.file, import_format, session)
+
+
+@teachers_router.delete("/{teacher_id}", response_model=DeleteTeacher)
+async def delete_teacher(teacher_id: UUID, session: Annotated[AsyncSession, Depends(get_session)],
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    deleted_teacher = await delete_teacher_by_id(teacher_id, current_user.id, session)
+    if not deleted_teacher:
+        raise not_found_exception
     return deleted_teacher
 
 
@@ -62,40 +108,83 @@ async def delete_teacher(teacher_id: UUID, session: Annotated[AsyncSession, Depe
 
 @subjects_router.post("/", response_model=SubjectResponse)
 async def create_subject(subject: CreateSubject, session: Annotated[AsyncSession, Depends(get_session)],
-                         current_user: Annotated[UserInDB, Depends(auth_get_current_user)]):
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
     created_subject = await create_subject_by_user_id(current_user.id, subject, session)
     return created_subject
 
 
-@subjects_router.get("/", response_model=list[SubjectResponse])
+@subjects_router.post("/import", response_model=ImportResponse)
+async def import_subjects(file: UploadFile, session: Annotated[AsyncSession, Depends(get_session)],
+                          current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                          import_format: FileFormat = FileFormats.ndjson):
+    return await import_by_user_id(current_user.id, SubjectDB, ImportSubject, file.file, import_format, session)
+
+
+@subjects_router.get("/", response_model=list[SubjectResponse], dependencies=[Depends(check_revision_etag)])
 async def get_all_subjects(session: Annotated[AsyncSession, Depends(get_session)],
-                           current_user: Annotated[UserInDB, Depends(auth_get_current_user)],
+                           current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                           response: Response,
                            sort: Annotated[SubjectSorts | None, Query()] = None,
-                           desc: Annotated[bool, Query()] = False):
-    subjects = await get_subjects_by_user_id(current_user.id, sort, desc, session)
+                           desc: Annotated[bool, Query()] = False,
+                           cursor: Annotated[str | None, Query()] = None,
+                           limit: PageLimit = settings.page_default_limit,
+                           fast: Annotated[bool, Query()] = False):
+    if fast:
+        subjects, next_cursor = await get_subject_rows_by_user_id(current_user.id, sort, desc, cursor, limit, session)
+    else:
+        subjects, next_cursor = await get_subjects_by_user_id(current_user.id, sort, desc, cursor, limit, session)
+    if not subjects:
+        raise not_found_exception
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fast:
+        return json_bytes_response(subjects, response.headers)
+    return model_response(SubjectResponseList, subjects, response.headers)
+
+
+@subjects_router.get("/summary", response_model=list[SubjectSummaryResponse],
+                     dependencies=[Depends(check_time_sensitive_etag)])
+async def get_subjects_summary(session: Annotated[AsyncSession, Depends(get_session)],
+                               current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                               response: Response,
+                               sort: Annotated[SubjectSorts | None, Query()] = None,
+                               desc: Annotated[bool, Query()] = False,
+                               upcoming: Annotated[int, Query(ge=0, le=20)] = 0,
+                               cursor: Annotated[str | None, Query()] = None,
+                               limit: PageLimit = settings.page_default_limit):
+    subjects, next_cursor = await get_subjects_summary_by_user_id(current_user.id, sort, desc, cursor, limit, upcoming,
+                                                                  session)
     if not subjects:
         raise not_found_exception
-    return subjects
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return model_response(SubjectSummaryResponseList, subjects, response.headers)
 
 
-@subjects_router.get("/{subject_id}", response_model=SubjectResponse, dependencies=[Depends(check_access_to_subjects)])
+@subjects_router.get("/{subject_id}", response_model=SubjectResponse, dependencies=[Depends(check_revision_etag)])
 async def get_subject(subject: Annotated[Subject, Depends(check_subject_id)]):
     return subject
 
 
-@subjects_router.delete("/{subject_id}", response_model=DeleteSubject, dependencies=[Depends(check_access_to_subjects)])
-async def delete_subject(subject_id: UUID, session: Annotated[AsyncSession, Depends(get_session)]):
-    deleted_subject = await delete_subject_by_id(subject_id, session)
+@subjects_router.delete("/{subject_id}", response_model=DeleteSubject)
+async def delete_subject(subject_id: UUID, session: Annotated[AsyncSession, Depends(get_session)],
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    deleted_subject = await delete_subject_by_id(subject_id, current_user.id, session)
+    if not deleted_subject:
+        raise not_found_exception
     return deleted_subject
 
 
-@subjects_router.patch("/{subject_id}", response_model=UpdateSubject, dependencies=[Depends(check_access_to_subjects)])
+@subjects_router.patch("/{subject_id}", response_model=UpdateSubject)
 async def update_subject(subject_id: UUID,
                          body: UpdateSubjectRequest,
-                         session: Annotated[AsyncSession, Depends(get_session)]):
-    if body.dict(exclude_none=True) == {}:
+                         session: Annotated[AsyncSession, Depends(get_session)],
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    if body.model_dump(exclude_none=True) == {}:
         raise empty_body_exception
-    updated_subject = await update_subject_by_id(subject_id, body, session)
+    updated_subject = await update_subject_by_id(subject_id, current_user.id, body, session)
+    if not updated_subject:
+        raise not_found_exception
     return updated_subject
 
 
@@ -104,43 +193,169 @@ async def update_subject(subject_id: UUID,
 
 @tasks_router.post("/", response_model=TaskResponse)
 async def create_task(task: CreateTask, session: Annotated[AsyncSession, Depends(get_session)],
-                      current_user: Annotated[UserInDB, Depends(auth_get_current_user)]):
+                      current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
     created_task = await create_task_by_user_id(current_user.id, task, session)
     return created_task
 
 
-@tasks_router.get("/", response_model=list[TaskResponse])
+@tasks_router.post("/import", response_model=ImportResponse)
+async def import_tasks(file: UploadFile, session: Annotated[AsyncSession, Depends(get_session)],
+                       current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                       import_format: FileFormat = FileFormats.ndjson):
+    return await import_by_user_id(current_user.id, TaskDB, ImportTask, file.file, import_format, session)
+
+
+@tasks_router.get("/", response_model=list[TaskResponse], dependencies=[Depends(check_time_sensitive_etag)])
 async def get_all_tasks(
                         session: Annotated[AsyncSession, Depends(get_session)],
-                        current_user: Annotated[UserInDB, Depends(auth_get_current_user)],
+                        current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                        response: Response,
                         sort: Annotated[TaskSorts | None, Query()] = None,
                         desc: Annotated[bool, Query()] = False,
                         priority: Annotated[Priority | None, Query()] = None,
                         task_type: Annotated[TasksTypes | None, Query()] = None,
                         include_expired: Annotated[bool | None, Query()] = None,
+                        cursor: Annotated[str | None, Query()] = None,
+                        limit: PageLimit = settings.page_default_limit,
+                        fast: Annotated[bool, Query()] = False,
                         ):
-    tasks = await get_tasks_by_user_id(current_user.id, sort, desc, priority, task_type, include_expired, session)
+    tasks_getter = get_task_rows_by_user_id if fast else get_tasks_by_user_id
+    tasks, next_cursor = await tasks_getter(current_user.id, sort, desc, priority, task_type, include_expired,
+                                            cursor, limit, session)
     if not tasks:
         raise not_found_exception
-    return tasks
-
-
-@tasks_router.get("/{task_id}", response_model=TaskResponse, dependencies=[Depends(check_access_to_tasks)])
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if fast:
+        return json_bytes_response(tasks, response.headers)
+    return model_response(TaskResponseList, tasks, response.headers)
+
+
+@tasks_router.get("/stats", response_model=TaskStatsResponse, dependencies=[Depends(check_time_sensitive_etag)])
+async def get_tasks_stats(session: Annotated[AsyncSession, Depends(get_session)],
+                          current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    return await get_tasks_stats_by_user_id(current_user.id, session)
+
+
+@tasks_router.get("/upcoming", response_model=list[TaskResponse], dependencies=[Depends(check_time_sensitive_etag)])
+async def get_upcoming_tasks(session: Annotated[AsyncSession, Depends(get_session)],
+                             current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                             response: Response,
+                             within: Annotated[timedelta, Query()] = timedelta(days=1),
+                             only_open: Annotated[bool, Query()] = True,
+                             cursor: Annotated[str | None, Query()] = None,
+                             limit: PageLimit = settings.page_default_limit):
+    if not timedelta(0) < within <= timedelta(days=settings.upcoming_max_window_days):
+        raise invalid_window_exception
+    tasks, next_cursor = await get_upcoming_tasks_by_user_id(current_user.id, within, only_open, cursor, limit, session)
+    if not tasks:
+        raise not_found_exception
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return model_response(TaskResponseList, tasks, response.headers)
+
+
+@tasks_router.get("/search", response_model=list[TaskResponse], dependencies=[Depends(check_time_sensitive_etag)])
+async def search_tasks(session: Annotated[AsyncSession, Depends(get_session)],
+                       current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                       response: Response,
+                       q: Annotated[str, Query(min_length=1, max_length=200)],
+                       priority: Annotated[Priority | None, Query()] = None,
+                       task_type: Annotated[TasksTypes | None, Query()] = None,
+                       include_expired: Annotated[bool | None, Query()] = None,
+                       limit: Annotated[int, Query(gt=0, le=settings.page_max_limit)] = settings.search_default_limit):
+    tasks = await search_tasks_by_user_id(current_user.id, q, priority, task_type, include_expired, limit, session)
+    if not tasks:
+        raise not_found_exception
+    return model_response(TaskResponseList, tasks, response.headers)
+
+
+@tasks_router.get("/export", response_class=StreamingResponse)
+async def export_tasks(current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+                       export_format: FileFormat = FileFormats.ndjson,
+                       priority: Annotated[Priority | None, Query()] = None,
+                       task_type: Annotated[TasksTypes | None, Query()] = None,
+                       include_expired: Annotated[bool | None, Query()] = None):
+    media_type = "text/csv" if export_format == FileFormats.csv else "application/x-ndjson"
+    return StreamingResponse(
+        export_tasks_by_user_id(current_user.id, export_format, priority, task_type, include_expired),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{export_format.value}"'},
+    )
+
+
+@tasks_router.post("/batch", response_model=BatchTasksResponse)
+async def create_tasks(tasks: Annotated[list[CreateTask], Body(min_length=1, max_length=settings.batch_max_size)],
+                       session: Annotated[AsyncSession, Depends(get_session)],
+                       current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    results = await create_tasks_batch(current_user.id, tasks, session)
+    return {"results": results}
+
+
+@tasks_router.patch("/batch", response_model=BatchTasksResponse)
+async def update_tasks(tasks: Annotated[list[BatchUpdateTask], Body(min_length=1, max_length=settings.batch_max_size)],
+                       session: Annotated[AsyncSession, Depends(get_session)],
+                       current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    if len({task.id for task in tasks}) != len(tasks):
+        raise duplicate_batch_ids_exception
+    results = await update_tasks_batch(current_user.id, tasks, session)
+    return {"results": results}
+
+
+@tasks_router.delete("/batch", response_model=BatchTasksResponse)
+async def delete_tasks(ids: Annotated[list[UUID], Body(embed=True, min_length=1, max_length=settings.batch_max_size)],
+                       session: Annotated[AsyncSession, Depends(get_session)],
+                       current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    if len(set(ids)) != len(ids):
+        raise duplicate_batch_ids_exception
+    results = await delete_tasks_batch(current_user.id, ids, session)
+    return {"results": results}
+
+
+@tasks_router.get("/{task_id}", response_model=TaskResponse, dependencies=[Depends(check_revision_etag)])
 async def get_task(task: Annotated[Task, Depends(check_task_id)]):
     return task
 
 
-@tasks_router.delete("/{task_id}", response_model=DeleteTask, dependencies=[Depends(check_access_to_tasks)])
-async def delete_subject(task_id: UUID, session: Annotated[AsyncSession, Depends(get_session)]):
-    deleted_task = await delete_task_by_id(task_id, session)
+@tasks_router.delete("/{task_id}", response_model=DeleteTask)
+async def delete_subject(task_id: UUID, session: Annotated[AsyncSession, Depends(get_session)],
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    deleted_task = await delete_task_by_id(task_id, current_user.id, session)
+    if not deleted_task:
+        raise not_found_exception
     return deleted_task
 
 
-@tasks_router.patch("/{task_id}", response_model=UpdateTask, dependencies=[Depends(check_access_to_tasks)])
+@tasks_router.patch("/{task_id}", response_model=UpdateTask)
 async def update_subject(task_id: UUID,
                          body: UpdateTaskRequest,
-                         session: Annotated[AsyncSession, Depends(get_session)]):
-    if body.dict(exclude_none=True) == {}:
+                         session: Annotated[AsyncSession, Depends(get_session)],
+                         current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    if body.model_dump(exclude_none=True) == {}:
         raise empty_body_exception
-    updated_task = await update_task_by_id(task_id, body, session)
+    updated_task = await update_task_by_id(task_id, current_user.id, body, session)
+    if not updated_task:
+        raise not_found_exception
     return updated_task
+
+
+"""Change feed"""
+
+
+@events_router.get("/", response_class=StreamingResponse)
+async def get_events(current_user: Annotated[Principal, Depends(auth_get_current_principal)]):
+    return StreamingResponse(stream_changes(current_user.id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+"""Incremental sync"""
+
+
+@sync_router.get("/", response_model=SyncResponse, dependencies=[Depends(check_revision_etag)])
+async def sync(session: Annotated[AsyncSession, Depends(get_session)],
+               current_user: Annotated[Principal, Depends(auth_get_current_principal)],
+               response: Response,
+               since: Annotated[int, Query(ge=0)] = 0):
+    changes = await get_changes_by_user_id(current_user.id, since, session)
+    return model_response(SyncResponseAdapter, changes, response.headers)
+
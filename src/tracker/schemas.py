@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import Enum
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 """Pydantic модели"""
 
@@ -24,9 +24,9 @@ class Priority(str, Enum):
 class Task(BaseModel):
 	id: UUID
 	name: str = Field(max_length=100)
-	deadline: datetime | None
-	description: str | None
-	type: TasksTypes | None
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
 	priority: Priority
 	status: bool = False
 	user_id: UUID
@@ -37,16 +37,16 @@ class Teacher(BaseModel):
 	id: UUID
 	name: str
 	surname: str
-	father_name: str | None
-	phone_number: str | None
+	father_name: str | None = None
+	phone_number: str | None = None
 	user_id: UUID
 
 
 class Subject(BaseModel):
 	id: UUID
 	name: str
-	course: int | None
-	teacher_id: UUID | None
+	course: int | None = None
+	teacher_id: UUID | None = None
 	user_id: UUID
 
 
@@ -54,66 +54,71 @@ class TeacherResponse(BaseModel):
 	id: UUID
 	name: str
 	surname: str
-	father_name: str | None
-	phone_number: str | None
+	father_name: str | None = None
+	phone_number: str | None = None
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class CreateTeacher(BaseModel):
 	name: str = Field(max_length=100)
 	surname: str = Field(max_length=100)
-	father_name: str | None = Field(max_length=100)
-	phone_number: str | None = Field(regex=r"^(?:\+7|8)?9\d{9}$")
+	father_name: str | None = Field(default=None, max_length=100)
+	phone_number: str | None = Field(default=None, pattern=r"^(?:\+7|8)?9\d{9}$")
 
 
 class DeleteTeacher(BaseModel):
 	id: UUID
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class CreateSubject(BaseModel):
 	name: str = Field(max_length=100, min_length=3)
-	course: int | None = Field(gt=0, lt=9)
-	teacher_id: UUID | None
+	course: int | None = Field(default=None, gt=0, lt=9)
+	teacher_id: UUID | None = None
 
-	class Congig:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class InnerSubjectTaskResponse(BaseModel):
 	id: UUID
 	name: str
-	deadline: datetime | None
-	description: str | None
-	type: TasksTypes | None
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
 	priority: Priority
 	status: bool
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class SubjectResponse(BaseModel):
 	id: UUID
 	name: str
-	course: int | None
-	teacher: TeacherResponse | None
-	tasks_count: int | None
+	course: int | None = None
+	teacher: TeacherResponse | None = None
+	tasks_count: int | None = None
 	tasks: list[InnerSubjectTaskResponse]
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
+
+
+class SubjectSummaryResponse(BaseModel):
+	id: UUID
+	name: str
+	course: int | None = None
+	teacher: TeacherResponse | None = None
+	tasks_count: int
+	upcoming_tasks: list[InnerSubjectTaskResponse] = []
+
+	model_config = ConfigDict(from_attributes=True)
 
 
 class DeleteSubject(BaseModel):
 	id: UUID
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class UpdateSubject(SubjectResponse):
@@ -121,40 +126,38 @@ class UpdateSubject(SubjectResponse):
 
 
 class UpdateSubjectRequest(BaseModel):
-	name: str | None
-	course: int | None
-	teacher_id: UUID | None
+	name: str | None = None
+	course: int | None = None
+	teacher_id: UUID | None = None
 
 
 class InnerTaskSubjectResponse(BaseModel):
 	id: UUID
 	name: str
-	course: int | None
-	teacher: TeacherResponse | None
+	course: int | None = None
+	teacher: TeacherResponse | None = None
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class TaskResponse(BaseModel):
 	id: UUID
 	name: str
-	deadline: datetime | None
-	description: str | None
-	type: TasksTypes | None
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
 	priority: Priority
 	status: bool
 	subject: InnerTaskSubjectResponse
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class CreateTask(BaseModel):
 	name: str = Field(max_length=100)
-	deadline: datetime | None
-	description: str | None
-	type: TasksTypes | None
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
 	priority: Priority
 	subject_id: UUID
 
@@ -162,24 +165,147 @@ class CreateTask(BaseModel):
 class DeleteTask(BaseModel):
 	id: UUID
 
-	class Config:
-		orm_mode = True
+	model_config = ConfigDict(from_attributes=True)
 
 
 class UpdateTaskRequest(BaseModel):
-	name: str | None = Field(max_length=100)
-	deadline: datetime | None
-	description: str | None
-	type: TasksTypes | None
-	status: bool | None  # Possible that this row drop my nervous system if future
-	priority: Priority | None
-	subject_id: UUID | None
+	name: str | None = Field(default=None, max_length=100)
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
+	status: bool | None = None  # Possible that this row drop my nervous system if future
+	priority: Priority | None = None
+	subject_id: UUID | None = None
 
 
 class UpdateTask(TaskResponse):
 	pass
 
 
+class BatchUpdateTask(UpdateTaskRequest):
+	id: UUID
+
+
+class BatchItemStatus(str, Enum):
+	created = "created"
+	updated = "updated"
+	deleted = "deleted"
+	not_found = "not_found"
+	invalid_subject = "invalid_subject"
+
+
+class BatchTaskResult(BaseModel):
+	index: int
+	id: UUID | None = None
+	status: BatchItemStatus
+	task: TaskResponse | None = None
+
+
+class BatchTasksResponse(BaseModel):
+	results: list[BatchTaskResult]
+
+
+class TaskCounts(BaseModel):
+	total: int
+	done: int
+	overdue: int
+	completion_ratio: float
+	by_priority: dict[Priority, int]
+	by_type: dict[TasksTypes, int]
+
+
+class SubjectTaskStats(TaskCounts):
+	subject_id: UUID
+
+
+class TaskStatsResponse(TaskCounts):
+	subjects: list[SubjectTaskStats]
+
+
+class SyncTeacher(TeacherResponse):
+	revision: int
+	updated_at: datetime
+
+
+class SyncSubject(BaseModel):
+	id: UUID
+	name: str
+	course: int | None = None
+	teacher_id: UUID | None = None
+	revision: int
+	updated_at: datetime
+
+
+class SyncTask(BaseModel):
+	id: UUID
+	name: str
+	deadline: datetime | None = None
+	description: str | None = None
+	type: TasksTypes | None = None
+	priority: Priority
+	status: bool
+	subject_id: UUID
+	revision: int
+	updated_at: datetime
+
+
+class SyncDeleted(BaseModel):
+	teachers: list[UUID] = []
+	subjects: list[UUID] = []
+	tasks: list[UUID] = []
+
+
+class SyncResponse(BaseModel):
+	revision: int
+	reset: bool
+	teachers: list[SyncTeacher]
+	subjects: list[SyncSubject]
+	tasks: list[SyncTask]
+	deleted: SyncDeleted
+
+
+class TrackerEntities(str, Enum):
+	teacher = "teacher"
+	subject = "subject"
+	task = "task"
+
+
+class ChangeActions(str, Enum):
+	created = "created"
+	updated = "updated"
+	deleted = "deleted"
+
+
+class FileFormats(str, Enum):
+	ndjson = "ndjson"
+	csv = "csv"
+
+
+class ImportTeacher(CreateTeacher):
+	id: UUID | None = None
+
+
+class ImportSubject(CreateSubject):
+	id: UUID | None = None
+
+
+class ImportTask(CreateTask):
+	id: UUID | None = None
+
+
+class ImportRowError(BaseModel):
+	row: int
+	detail: list[dict]
+
+
+class ImportResponse(BaseModel):
+	received: int
+	imported: int
+	skipped: int
+	invalid: int
+	errors: list[ImportRowError]
+
+
 class TeacherSorts(str, Enum):
 	by_name = "name"
 	by_surname = 'surname'
@@ -198,3 +324,12 @@ class TaskSorts(str, Enum):
 	by_type = "type"
 	by_priority = "priority"
 	by_status = "status"
+
+
+"""Compiled validators of list responses"""
+
+TeacherResponseList = TypeAdapter(list[TeacherResponse])
+SubjectResponseList = TypeAdapter(list[SubjectResponse])
+SubjectSummaryResponseList = TypeAdapter(list[SubjectSummaryResponse])
+TaskResponseList = TypeAdapter(list[TaskResponse])
+SyncResponseAdapter = TypeAdapter(SyncResponse)
@@ -1,18 +1,80 @@
-from typing import Sequence
+import codecs
+import csv
+import io
+import itertools
+import uuid
+from datetime import timedelta
+from typing import AsyncIterator, BinaryIO, Iterator, Sequence
 from uuid import UUID
 
-from sqlalchemy import select, RowMapping, Row, insert, delete, update, desc, func, text, case, literal
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import (select, RowMapping, Row, insert, delete, update, func, text, true, values, column, cast, any_,
+                        bindparam, table, literal, or_, false)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload, aliased
 
+from src.config import settings
+from src.database import async_session
+from src.pagination import decode_cursor, keyset_condition, keyset_order, fetch_limit, paginate
+from src.serialization import dump_json
 from src.tracker.models import Subject as SubjectDB
 from src.tracker.models import Task as TaskDB
 from src.tracker.models import Teacher as TeacherDB
+from src.tracker.models import Revision as RevisionDB
+from src.tracker.models import Tombstone as TombstoneDB
+from src.tracker.models import SEARCH_CONFIG
+from src.tracker.exceptions import invalid_import_file_exception
 from src.tracker.schemas import (Teacher, CreateTeacher, CreateSubject, UpdateSubjectRequest, CreateTask,
-                                 UpdateTaskRequest, TeacherSorts, SubjectSorts, TaskSorts, Priority, TasksTypes)
+                                 UpdateTaskRequest, TeacherSorts, SubjectSorts, TaskSorts, Priority, TasksTypes,
+                                 TaskStatsResponse, SubjectTaskStats, BatchUpdateTask, BatchTaskResult, BatchItemStatus,
+                                 TaskResponse, FileFormats, ImportRowError, ImportResponse,
+                                 TrackerEntities, ChangeActions)
 
 
-async def get_teacher_by_id(teacher_id: UUID, db_session: AsyncSession) -> Teacher | None:
-    query = select(TeacherDB).where(TeacherDB.id == teacher_id)
+async def get_revision(user_id: UUID, db_session: AsyncSession) -> int:
+    """Revision of all tracker data of the user, it grows with every change"""
+    res = await db_session.execute(select(RevisionDB.revision).where(RevisionDB.user_id == user_id))
+    return res.scalar_one_or_none() or 0
+
+
+CHANGES_CHANNEL = "tracker_changes"
+NOTIFY_MAX_IDS = 100
+
+
+async def bump_revision(user_id: UUID, db_session: AsyncSession) -> int:
+    """First statement of every change, the rows written by the change are stamped with the returned revision.
+    The row lock orders concurrent changes of one user: no revision is handed out before the lower ones are committed"""
+    query = pg_insert(RevisionDB).values(user_id=user_id, revision=1) \
+        .on_conflict_do_update(index_elements=[RevisionDB.user_id], set_={"revision": RevisionDB.revision + 1}) \
+        .returning(RevisionDB.revision)
+    res = await db_session.execute(query)
+    return res.scalar_one()
+
+
+async def notify_change(user_id: UUID, revision: int, entity: TrackerEntities, action: ChangeActions,
+                        ids: list[UUID] | None, db_session: AsyncSession):
+    """NOTIFYs CHANGES_CHANNEL, the notification is sent on commit. No ids (or too many for one payload)
+    means any entity of the kind may have changed"""
+    if ids is not None and len(ids) > NOTIFY_MAX_IDS:
+        ids = None
+    payload = dump_json({"user_id": user_id, "revision": revision, "entity": entity, "action": action, "ids": ids})
+    await db_session.execute(select(func.pg_notify(CHANGES_CHANNEL, payload.decode())))
+
+
+def insert_tombstones(entity: TrackerEntities, user_id: UUID, revision: int, deleted_ids):
+    """INSERT ... SELECT of tombstones for a select of ids, e.g. from a DELETE ... RETURNING cte"""
+    rows = select(literal(user_id, TombstoneDB.user_id.type), literal(entity.value, TombstoneDB.entity.type),
+                  deleted_ids, literal(revision, TombstoneDB.revision.type))
+    query = pg_insert(TombstoneDB).from_select(['user_id', 'entity', 'entity_id', 'revision'], rows)
+    return query.on_conflict_do_update(index_elements=[TombstoneDB.user_id, TombstoneDB.entity, TombstoneDB.entity_id],
+                                       set_={"revision": query.excluded.revision}) \
+        .returning(TombstoneDB.entity_id)
+
+
+async def get_teacher_by_id(teacher_id: UUID, user_id: UUID, db_session: AsyncSession) -> Teacher | None:
+    query = select(TeacherDB).where(TeacherDB.id == teacher_id, TeacherDB.user_id == user_id)
     res = await db_session.execute(query)
     teacher_row = res.fetchone()
     if teacher_row:
@@ -24,67 +86,90 @@ async def get_teacher_by_id(teacher_id: UUID, db_session: AsyncSession) -> Teach
                        user_id=teacher_row[0].user_id)
 
 
-async def get_teachers_by_user_id(user_id: UUID, sort: TeacherSorts | None, descending: bool,
-                                  db_session: AsyncSession) -> Sequence[Row | RowMapping] | None:
+async def get_teachers_by_user_id(user_id: UUID, sort: TeacherSorts | None, descending: bool, cursor: str | None,
+                                  limit: int | None,
+                                  db_session: AsyncSession) -> tuple[Sequence[Row | RowMapping], str | None]:
+    sort_expr = getattr(TeacherDB, sort) if sort is not None else None
     query = select(TeacherDB).where(TeacherDB.user_id == user_id)
-    if sort is not None and descending:
-        query = query.order_by(desc(getattr(TeacherDB, sort)))
-    elif sort is not None:
-        query = query.order_by(getattr(TeacherDB, sort))
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort, descending, sort_expr)
+        query = query.where(keyset_condition(sort_expr, value, TeacherDB.id, last_id, descending))
+    query = query.order_by(*keyset_order(sort_expr, TeacherDB.id, descending)).limit(fetch_limit(limit))
     res = await db_session.execute(query)
     teachers_rows = res.scalars().fetchall()
-    if teachers_rows:
-        return teachers_rows
+    return paginate(teachers_rows, sort, descending, limit,
+                    lambda teacher: getattr(teacher, sort) if sort is not None else None)
 
 
 async def create_teacher_by_user_id(user_id: UUID, teacher: CreateTeacher, db_session: AsyncSession):
-    query = insert(TeacherDB).values(**teacher.dict(), user_id=user_id).returning(TeacherDB)
+    revision = await bump_revision(user_id, db_session)
+    query = insert(TeacherDB).values(**teacher.model_dump(), user_id=user_id, revision=revision).returning(TeacherDB)
     res = await db_session.execute(query)
-    await db_session.commit()
     teacher_row = res.scalars().one()
+    await notify_change(user_id, revision, TrackerEntities.teacher, ChangeActions.created, [teacher_row.id],
+                        db_session)
+    await db_session.commit()
     return teacher_row
 
 
-async def delete_teacher_by_id(teacher_id: UUID, db_session: AsyncSession):
-    query = delete(TeacherDB).where(TeacherDB.id == teacher_id).returning(TeacherDB)
+async def delete_teacher_by_id(teacher_id: UUID, user_id: UUID, db_session: AsyncSession):
+    """Subjects of the teacher are unlinked here rather than by ON DELETE SET NULL, so they get the new revision"""
+    revision = await bump_revision(user_id, db_session)
+    await db_session.execute(update(SubjectDB).where(SubjectDB.teacher_id == teacher_id, SubjectDB.user_id == user_id)
+                             .values(teacher_id=None, revision=revision))
+    deleted = delete(TeacherDB).where(TeacherDB.id == teacher_id, TeacherDB.user_id == user_id) \
+        .returning(TeacherDB.id) \
+        .cte('deleted_teacher')
+    query = insert_tombstones(TrackerEntities.teacher, user_id, revision, deleted.c.id).add_cte(deleted)
     res = await db_session.execute(query)
+    deleted_teacher_row = res.one_or_none()
+    if not deleted_teacher_row:
+        await db_session.rollback()
+        return None
+    await notify_change(user_id, revision, TrackerEntities.teacher, ChangeActions.deleted, [teacher_id], db_session)
     await db_session.commit()
-    deleted_teacher_row = res.scalars().one()
-    if deleted_teacher_row:
-        return deleted_teacher_row
+    return {"id": deleted_teacher_row.entity_id}
 
 
 async def create_subject_by_user_id(user_id: UUID, subject: CreateSubject, db_session: AsyncSession):
-    query = insert(SubjectDB).values(**subject.dict(), user_id=user_id).returning(SubjectDB)
+    revision = await bump_revision(user_id, db_session)
+    query = insert(SubjectDB).values(**subject.model_dump(), user_id=user_id, revision=revision).returning(SubjectDB)
 
     res = await db_session.execute(query)
-    await db_session.commit()
     subject_row = res.scalars().one()
+    await notify_change(user_id, revision, TrackerEntities.subject, ChangeActions.created, [subject_row.id],
+                        db_session)
+    await db_session.commit()
 
-    query = select(SubjectDB).where(SubjectDB.id == subject_row.id)
-    res = await db_session.execute(query)
-    subject_row = res.scalars().one()
-    return subject_row
+    return await get_subject_by_id(subject_row.id, user_id, db_session)
 
 
-async def get_subjects_by_user_id(user_id: UUID, sort: SubjectSorts | None, descending: bool,
-                                  db_session: AsyncSession) -> Sequence[Row | RowMapping] | None:
+async def get_subjects_by_user_id(user_id: UUID, sort: SubjectSorts | None, descending: bool, cursor: str | None,
+                                  limit: int | None, db_session: AsyncSession,
+                                  with_tasks: bool = True) -> tuple[Sequence[Row | RowMapping], str | None]:
+    """Subjects with tasks_count set. Tasks are loaded only with with_tasks"""
     task_count = func.count(TaskDB.subject_id).label('task_count')
     query = select(SubjectDB, task_count) \
         .where(SubjectDB.user_id == user_id) \
         .outerjoin(TaskDB, SubjectDB.id == TaskDB.subject_id) \
         .group_by(SubjectDB.id)
-    if sort:
-        if sort != SubjectSorts.by_tasks_count:
-            if descending:
-                query = query.order_by(desc(getattr(SubjectDB, sort)))
-            else:
-                query = query.order_by(getattr(SubjectDB, sort))
+    match sort:
+        case None:
+            sort_expr = None
+        case SubjectSorts.by_tasks_count:
+            sort_expr = task_count
+        case _:
+            sort_expr = getattr(SubjectDB, sort)
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort, descending, sort_expr)
+        condition = keyset_condition(sort_expr, value, SubjectDB.id, last_id, descending)
+        if sort == SubjectSorts.by_tasks_count:
+            query = query.having(condition)
         else:
-            if descending:
-                query = query.order_by(desc(task_count))
-            else:
-                query = query.order_by(task_count)
+            query = query.where(condition)
+    query = query.order_by(*keyset_order(sort_expr, SubjectDB.id, descending)).limit(fetch_limit(limit))
+    if with_tasks:
+        query = query.options(selectinload(SubjectDB.tasks))
 
     res = await db_session.execute(query)
     subjects = []
@@ -92,113 +177,660 @@ async def get_subjects_by_user_id(user_id: UUID, sort: SubjectSorts | None, desc
         subject.tasks_count = count
         subjects.append(subject)
 
-    if subjects:
-        return subjects
+    return paginate(subjects, sort, descending, limit,
+                    lambda subject: getattr(subject, sort) if sort is not None else None)
+
+
+async def get_subjects_summary_by_user_id(user_id: UUID, sort: SubjectSorts | None, descending: bool,
+                                          cursor: str | None, limit: int | None, upcoming: int,
+                                          db_session: AsyncSession) -> tuple[Sequence[Row | RowMapping], str | None]:
+    """Subjects with tasks_count and at most `upcoming` nearest open tasks each, fetched with one lateral join"""
+    subjects, next_cursor = await get_subjects_by_user_id(user_id, sort, descending, cursor, limit, db_session,
+                                                          with_tasks=False)
+    for subject in subjects:
+        subject.upcoming_tasks = []
+    if not subjects or upcoming <= 0:
+        return subjects, next_cursor
+
+    upcoming_tasks = select(TaskDB.id, TaskDB.name, TaskDB.deadline, TaskDB.description, TaskDB.type,
+                            TaskDB.priority, TaskDB.status) \
+        .where(TaskDB.subject_id == SubjectDB.id, TaskDB.status.is_(False), TaskDB.deadline > func.now()) \
+        .order_by(TaskDB.deadline, TaskDB.id) \
+        .limit(upcoming) \
+        .lateral('upcoming_tasks')
+    query = select(SubjectDB.id.label('subject_id'), upcoming_tasks) \
+        .join(upcoming_tasks, true()) \
+        .where(SubjectDB.id.in_([subject.id for subject in subjects]))
+    res = await db_session.execute(query)
+    subjects_by_id = {subject.id: subject for subject in subjects}
+    for row in res.mappings():
+        subjects_by_id[row['subject_id']].upcoming_tasks.append(row)
+    return subjects, next_cursor
 
 
-async def get_subject_by_id(subject_id, db_session: AsyncSession) -> Row | RowMapping | None:
-    query = select(SubjectDB).where(SubjectDB.id == subject_id)
+async def get_subject_by_id(subject_id: UUID, user_id: UUID, db_session: AsyncSession) -> Row | RowMapping | None:
+    query = select(SubjectDB).where(SubjectDB.id == subject_id, SubjectDB.user_id == user_id) \
+        .options(joinedload(SubjectDB.teacher), selectinload(SubjectDB.tasks)) \
+        .execution_options(populate_existing=True)
     res = await db_session.execute(query)
     subject_row = res.scalars().one_or_none()
     if subject_row:
         return subject_row
 
 
-async def delete_subject_by_id(subject_id: UUID, db_session: AsyncSession):
-    query = delete(SubjectDB).where(SubjectDB.id == subject_id).returning(SubjectDB)
+async def delete_subject_by_id(subject_id: UUID, user_id: UUID, db_session: AsyncSession):
+    """Tasks of the subject are deleted here rather than by ON DELETE CASCADE, so they get tombstones too"""
+    revision = await bump_revision(user_id, db_session)
+    deleted_tasks = delete(TaskDB).where(TaskDB.subject_id == subject_id, TaskDB.user_id == user_id) \
+        .returning(TaskDB.id) \
+        .cte('deleted_tasks')
+    await db_session.execute(insert_tombstones(TrackerEntities.task, user_id, revision, deleted_tasks.c.id)
+                             .add_cte(deleted_tasks))
+    deleted = delete(SubjectDB).where(SubjectDB.id == subject_id, SubjectDB.user_id == user_id) \
+        .returning(SubjectDB.id) \
+        .cte('deleted_subject')
+    query = insert_tombstones(TrackerEntities.subject, user_id, revision, deleted.c.id).add_cte(deleted)
     res = await db_session.execute(query)
+    deleted_subject_row = res.one_or_none()
+    if not deleted_subject_row:
+        await db_session.rollback()
+        return None
+    await notify_change(user_id, revision, TrackerEntities.subject, ChangeActions.deleted, [subject_id], db_session)
     await db_session.commit()
-    deleted_subject_row = res.scalars().one()
-    if deleted_subject_row:
-        return deleted_subject_row
-
-
-async def update_subject_by_id(subject_id: UUID, body: UpdateSubjectRequest, db_session: AsyncSession):
-    query = update(SubjectDB).where(SubjectDB.id == subject_id) \
-        .values(**body.dict(exclude_none=True)) \
-        .returning(SubjectDB)
+    return {"id": deleted_subject_row.entity_id}
+
+
+async def update_subject_by_id(subject_id: UUID, user_id: UUID, body: UpdateSubjectRequest,
+                               db_session: AsyncSession):
+    revision = await bump_revision(user_id, db_session)
+    updated = update(SubjectDB).where(SubjectDB.id == subject_id, SubjectDB.user_id == user_id) \
+        .values(**body.model_dump(exclude_none=True), revision=revision) \
+        .returning(*SubjectDB.__table__.c) \
+        .cte('updated_subject')
+    updated_subject = aliased(SubjectDB, updated)
+    query = select(updated_subject) \
+        .options(joinedload(updated_subject.teacher), selectinload(updated_subject.tasks)) \
+        .execution_options(populate_existing=True)
     res = await db_session.execute(query)
-    updated_subject_row = res.scalars().one()
-    await db_session.refresh(updated_subject_row)
+    updated_subject_row = res.scalars().one_or_none()
+    if not updated_subject_row:
+        await db_session.rollback()
+        return None
+    await notify_change(user_id, revision, TrackerEntities.subject, ChangeActions.updated, [subject_id], db_session)
     await db_session.commit()
     return updated_subject_row
 
 
 async def create_task_by_user_id(user_id: UUID, task: CreateTask, db_session: AsyncSession):
-    query = insert(TaskDB).values(**task.dict(), user_id=user_id).returning(TaskDB)
+    revision = await bump_revision(user_id, db_session)
+    query = insert(TaskDB).values(**task.model_dump(), user_id=user_id, revision=revision).returning(TaskDB)
     res = await db_session.execute(query)
+    task_row = res.scalars().one()
+    await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.created, [task_row.id], db_session)
     await db_session.commit()
-    teacher_row = res.scalars().one()
-    return teacher_row
+    return task_row
 
 
 async def get_tasks_by_user_id(user_id: UUID, sort: TaskSorts | None, descending: bool,
                                priority: Priority | None,
                                task_type: TasksTypes | None,
-                               include_expired: bool | None, 
-                               db_session: AsyncSession) -> Sequence[Row | RowMapping] | None:
-    query = select(TaskDB).where(TaskDB.user_id == user_id)
+                               include_expired: bool | None,
+                               cursor: str | None,
+                               limit: int | None,
+                               db_session: AsyncSession) -> tuple[Sequence[Row | RowMapping], str | None]:
+    query = select(TaskDB).options(task_loading(TaskDB))
+    query = filter_tasks(query, user_id, priority, task_type, include_expired)
+    query, sort_expr = paginate_tasks(query, sort, descending, cursor, limit)
+
+    res = await db_session.execute(query)
+    tasks_rows = res.scalars().all()
+    return paginate(tasks_rows, sort, descending, limit,
+                    lambda task: getattr(task, sort_expr.key) if sort_expr is not None else None)
+
+
+async def search_tasks_by_user_id(user_id: UUID, search_query: str, priority: Priority | None,
+                                  task_type: TasksTypes | None, include_expired: bool | None, limit: int,
+                                  db_session: AsyncSession) -> Sequence[Row | RowMapping]:
+    """Matches the full-text vector of name and description, or name by prefix or trigram similarity.
+    Best matches first"""
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search_query)
+    rank = func.ts_rank_cd(TaskDB.search_vector, ts_query) + func.similarity(TaskDB.name, search_query)
+    query = select(TaskDB).options(task_loading(TaskDB)) \
+        .where(or_(TaskDB.search_vector.bool_op('@@')(ts_query),
+                   TaskDB.name.istartswith(search_query, autoescape=True),
+                   TaskDB.name.bool_op('%')(search_query))) \
+        .order_by(rank.desc(), TaskDB.id) \
+        .limit(limit)
+    query = filter_tasks(query, user_id, priority, task_type, include_expired)
+    res = await db_session.execute(query)
+    return res.scalars().all()
+
+
+async def get_upcoming_tasks_by_user_id(user_id: UUID, within: timedelta, only_open: bool, cursor: str | None,
+                                       limit: int | None, db_session: AsyncSession
+                                       ) -> tuple[Sequence[Row | RowMapping], str | None]:
+    """Tasks due from now to now + within, soonest first. Open tasks are served by the partial
+    ix_tasks_user_id_deadline_open index"""
+    query = select(TaskDB).options(task_loading(TaskDB)) \
+        .where(TaskDB.user_id == user_id,
+               TaskDB.deadline > func.now(),
+               TaskDB.deadline <= func.now() + within)
+    if only_open:
+        query = query.where(TaskDB.status == false())
+    query, _ = paginate_tasks(query, TaskSorts.by_deadline, False, cursor, limit)
+
+    res = await db_session.execute(query)
+    tasks_rows = res.scalars().all()
+    return paginate(tasks_rows, TaskSorts.by_deadline, False, limit, lambda task: task.deadline)
+
+
+def filter_tasks(query, user_id: UUID, priority: Priority | None, task_type: TasksTypes | None,
+                 include_expired: bool | None):
+    query = query.where(TaskDB.user_id == user_id)
     if not include_expired and include_expired is not None:
         query = query.where(TaskDB.deadline > func.now())
     if priority:
         query = query.where(TaskDB.priority == priority)
     if task_type:
         query = query.where(TaskDB.type == task_type)
+    return query
+
+
+def task_sort_expression(sort: TaskSorts | None):
     match sort:
         case TaskSorts.by_priority:
-            if descending:
-                query = query.order_by(desc(
-                    case(
-                        (TaskDB.priority == 'Low', literal(1)),
-                        (TaskDB.priority == 'Medium', literal(2)),
-                        (TaskDB.priority == 'High', literal(3))
-                    )
-                ))
-            else:
-                query = query.order_by(
-                    case(
-                        (TaskDB.priority == 'Low', literal(1)),
-                        (TaskDB.priority == 'Medium', literal(2)),
-                        (TaskDB.priority == 'High', literal(3))
-                    )
-                )
+            return TaskDB.priority_rank
         case None:
-            pass
+            return None
         case _:
-            if descending:
-                query = query.order_by(desc(getattr(TaskDB, sort)))
-            else:
-                query = query.order_by(getattr(TaskDB, sort))
-
+            return getattr(TaskDB, sort)
+
+
+def paginate_tasks(query, sort: TaskSorts | None, descending: bool, cursor: str | None, limit: int | None):
+    sort_expr = task_sort_expression(sort)
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort, descending, sort_expr)
+        query = query.where(keyset_condition(sort_expr, value, TaskDB.id, last_id, descending))
+    return query.order_by(*keyset_order(sort_expr, TaskDB.id, descending)).limit(fetch_limit(limit)), sort_expr
+
+
+"""Plain rows for the fast serialization path: only the columns of the response, no ORM objects or pydantic"""
+
+TASK_ROW_COLUMNS = (
+    TaskDB.id, TaskDB.name, TaskDB.deadline, TaskDB.description, TaskDB.type, TaskDB.priority, TaskDB.status,
+    TaskDB.priority_rank,
+    SubjectDB.id.label('subject_id'), SubjectDB.name.label('subject_name'), SubjectDB.course.label('subject_course'),
+    TeacherDB.id.label('teacher_id'), TeacherDB.name.label('teacher_name'),
+    TeacherDB.surname.label('teacher_surname'), TeacherDB.father_name.label('teacher_father_name'),
+    TeacherDB.phone_number.label('teacher_phone_number'),
+)
+
+
+def select_task_rows():
+    return select(*TASK_ROW_COLUMNS) \
+        .join(SubjectDB, TaskDB.subject_id == SubjectDB.id) \
+        .outerjoin(TeacherDB, SubjectDB.teacher_id == TeacherDB.id)
+
+
+def teacher_row_to_dict(row, prefix: str = '') -> dict | None:
+    if row[f'{prefix}id'] is None:
+        return None
+    return {
+        "id": row[f'{prefix}id'],
+        "name": row[f'{prefix}name'],
+        "surname": row[f'{prefix}surname'],
+        "father_name": row[f'{prefix}father_name'],
+        "phone_number": row[f'{prefix}phone_number'],
+    }
+
+
+def task_row_to_dict(row: RowMapping) -> dict:
+    """Same shape as TaskResponse"""
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "deadline": row['deadline'],
+        "description": row['description'],
+        "type": row['type'],
+        "priority": row['priority'],
+        "status": row['status'],
+        "subject": {
+            "id": row['subject_id'],
+            "name": row['subject_name'],
+            "course": row['subject_course'],
+            "teacher": teacher_row_to_dict(row, 'teacher_'),
+        },
+    }
+
+
+async def get_task_rows_by_user_id(user_id: UUID, sort: TaskSorts | None, descending: bool,
+                                   priority: Priority | None,
+                                   task_type: TasksTypes | None,
+                                   include_expired: bool | None,
+                                   cursor: str | None,
+                                   limit: int | None,
+                                   db_session: AsyncSession) -> tuple[list[dict], str | None]:
+    query = filter_tasks(select_task_rows(), user_id, priority, task_type, include_expired)
+    query, sort_expr = paginate_tasks(query, sort, descending, cursor, limit)
     res = await db_session.execute(query)
-    tasks_rows = res.scalars().all()
-    if tasks_rows:
-        return tasks_rows
-
-
-async def get_task_by_id(task_id, db_session: AsyncSession) -> Row | RowMapping | None:
-    query = select(TaskDB).where(TaskDB.id == task_id)
+    rows, next_cursor = paginate(res.all(), sort, descending, limit,
+                                 lambda row: getattr(row, sort_expr.key) if sort_expr is not None else None)
+    return [task_row_to_dict(row._mapping) for row in rows], next_cursor
+
+
+TASK_CSV_COLUMNS = [column.key for column in TASK_ROW_COLUMNS if column.key != 'priority_rank']
+
+
+async def export_tasks_by_user_id(user_id: UUID, export_format: FileFormats, priority: Priority | None,
+                                  task_type: TasksTypes | None, include_expired: bool | None) -> AsyncIterator[bytes]:
+    """Streams tasks through a server-side cursor and yields encoded chunks of export_chunk_rows rows.
+    Runs after the endpoint has returned, so it opens its own session."""
+    query = filter_tasks(select_task_rows(), user_id, priority, task_type, include_expired) \
+        .order_by(TaskDB.deadline, TaskDB.id) \
+        .execution_options(yield_per=settings.export_chunk_rows)
+    async with async_session() as db_session:
+        result = await db_session.stream(query)
+        if export_format == FileFormats.csv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(TASK_CSV_COLUMNS)
+            async for rows in result.mappings().partitions():
+                writer.writerows([row[column] for column in TASK_CSV_COLUMNS] for row in rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            async for rows in result.mappings().partitions():
+                yield b"".join(dump_json(task_row_to_dict(row)) + b"\n" for row in rows)
+
+
+async def get_subject_rows_by_user_id(user_id: UUID, sort: SubjectSorts | None, descending: bool, cursor: str | None,
+                                      limit: int | None, db_session: AsyncSession) -> tuple[list[dict], str | None]:
+    """Same shape as SubjectResponse, tasks of the page are fetched as plain rows with one query"""
+    subjects, next_cursor = await get_subjects_by_user_id(user_id, sort, descending, cursor, limit, db_session,
+                                                          with_tasks=False)
+    subject_dicts = {}
+    for subject in subjects:
+        teacher = subject.teacher
+        subject_dicts[subject.id] = {
+            "id": subject.id,
+            "name": subject.name,
+            "course": subject.course,
+            "teacher": None if teacher is None else {
+                "id": teacher.id,
+                "name": teacher.name,
+                "surname": teacher.surname,
+                "father_name": teacher.father_name,
+                "phone_number": teacher.phone_number,
+            },
+            "tasks_count": subject.tasks_count,
+            "tasks": [],
+        }
+    if subject_dicts:
+        query = select(TaskDB.subject_id, TaskDB.id, TaskDB.name, TaskDB.deadline, TaskDB.description, TaskDB.type,
+                       TaskDB.priority, TaskDB.status) \
+            .where(TaskDB.subject_id == any_(ids_array('subject_ids', subject_dicts)))
+        res = await db_session.execute(query)
+        for row in res.mappings():
+            task = dict(row)
+            subject_dicts[task.pop('subject_id')]["tasks"].append(task)
+    return list(subject_dicts.values()), next_cursor
+
+
+async def get_task_by_id(task_id: UUID, user_id: UUID, db_session: AsyncSession) -> Row | RowMapping | None:
+    query = select(TaskDB).where(TaskDB.id == task_id, TaskDB.user_id == user_id).options(task_loading(TaskDB))
     res = await db_session.execute(query)
     task_row = res.scalars().one_or_none()
     if task_row:
         return task_row
 
 
-async def delete_task_by_id(task_id: UUID, db_session: AsyncSession):
-    query = delete(TaskDB).where(TaskDB.id == task_id).returning(TaskDB)
+async def delete_task_by_id(task_id: UUID, user_id: UUID, db_session: AsyncSession):
+    revision = await bump_revision(user_id, db_session)
+    deleted = delete(TaskDB).where(TaskDB.id == task_id, TaskDB.user_id == user_id) \
+        .returning(TaskDB.id) \
+        .cte('deleted_task')
+    query = insert_tombstones(TrackerEntities.task, user_id, revision, deleted.c.id).add_cte(deleted)
+    res = await db_session.execute(query)
+    deleted_task_row = res.one_or_none()
+    if not deleted_task_row:
+        await db_session.rollback()
+        return None
+    await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.deleted, [task_id], db_session)
+    await db_session.commit()
+    return {"id": deleted_task_row.entity_id}
+
+
+async def update_task_by_id(task_id: UUID, user_id: UUID, body: UpdateTaskRequest, db_session: AsyncSession):
+    """UPDATE ... RETURNING wrapped in a CTE, so the task comes back with its subject and teacher in one statement"""
+    revision = await bump_revision(user_id, db_session)
+    updated = update(TaskDB).where(TaskDB.id == task_id, TaskDB.user_id == user_id) \
+        .values(**body.model_dump(exclude_none=True), revision=revision) \
+        .returning(*TaskDB.__table__.c) \
+        .cte('updated_task')
+    updated_task = aliased(TaskDB, updated)
+    query = select(updated_task).options(task_loading(updated_task)).execution_options(populate_existing=True)
     res = await db_session.execute(query)
+    updated_task_row = res.scalars().one_or_none()
+    if not updated_task_row:
+        await db_session.rollback()
+        return None
+    await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.updated, [task_id], db_session)
     await db_session.commit()
-    deleted_task_row = res.scalars().one()
-    if deleted_task_row:
-        return deleted_task_row
+    return updated_task_row
 
 
-async def update_task_by_id(task_id: UUID, body: UpdateTaskRequest, db_session: AsyncSession):
-    query = update(TaskDB).where(TaskDB.id == task_id) \
-        .values(**body.dict(exclude_none=True)) \
-        .returning(TaskDB)
+async def get_tasks_stats_by_user_id(user_id: UUID, db_session: AsyncSession) -> TaskStatsResponse:
+    """Dashboard counters per subject from one grouped query, totals are summed up here"""
+    is_open = TaskDB.status.is_not(True)
+    query = select(
+        TaskDB.subject_id,
+        func.count().label('total'),
+        func.count().filter(TaskDB.status.is_(True)).label('done'),
+        func.count().filter(is_open, TaskDB.deadline < func.now()).label('overdue'),
+        *(func.count().filter(TaskDB.priority == priority.value).label(f'priority_{priority.name}')
+          for priority in Priority),
+        *(func.count().filter(TaskDB.type == task_type.value).label(f'type_{task_type.name}')
+          for task_type in TasksTypes),
+    ).where(TaskDB.user_id == user_id).group_by(TaskDB.subject_id)
     res = await db_session.execute(query)
-    updated_task_row = res.scalars().one()
-    await db_session.refresh(updated_task_row)
+
+    subjects = []
+    for row in res.mappings():
+        subjects.append(SubjectTaskStats(
+            subject_id=row['subject_id'],
+            total=row['total'],
+            done=row['done'],
+            overdue=row['overdue'],
+            completion_ratio=row['done'] / row['total'],
+            by_priority={priority: row[f'priority_{priority.name}'] for priority in Priority},
+            by_type={task_type: row[f'type_{task_type.name}'] for task_type in TasksTypes},
+        ))
+    total = sum(subject.total for subject in subjects)
+    done = sum(subject.done for subject in subjects)
+    return TaskStatsResponse(
+        total=total,
+        done=done,
+        overdue=sum(subject.overdue for subject in subjects),
+        completion_ratio=done / total if total else 0.0,
+        by_priority={priority: sum(subject.by_priority[priority] for subject in subjects) for priority in Priority},
+        by_type={task_type: sum(subject.by_type[task_type] for subject in subjects) for task_type in TasksTypes},
+        subjects=subjects,
+    )
+
+
+def ids_array(name: str, ids) -> bindparam:
+    """One array parameter for `= ANY(...)` instead of a parameter per id"""
+    return bindparam(name, list(ids), type_=ARRAY(TaskDB.id.type))
+
+
+async def get_owned_subject_ids(subject_ids: set[UUID], user_id: UUID, db_session: AsyncSession) -> set[UUID]:
+    if not subject_ids:
+        return set()
+    query = select(SubjectDB.id).where(SubjectDB.id == any_(ids_array('subject_ids', subject_ids)),
+                                       SubjectDB.user_id == user_id)
+    res = await db_session.execute(query)
+    return set(res.scalars().all())
+
+
+async def create_tasks_batch(user_id: UUID, tasks: list[CreateTask], db_session: AsyncSession) -> list[BatchTaskResult]:
+    """Inserts all tasks whose subject belongs to the user with one multi-row INSERT ... RETURNING"""
+    owned_subject_ids = await get_owned_subject_ids({task.subject_id for task in tasks}, user_id, db_session)
+    results = []
+    rows = []
+    for index, task in enumerate(tasks):
+        if task.subject_id not in owned_subject_ids:
+            results.append(BatchTaskResult(index=index, id=None, status=BatchItemStatus.invalid_subject))
+            continue
+        task_id = uuid.uuid4()
+        rows.append({**task.model_dump(), "id": task_id, "user_id": user_id})
+        results.append(BatchTaskResult(index=index, id=task_id, status=BatchItemStatus.created))
+
+    if rows:
+        revision = await bump_revision(user_id, db_session)
+        for row in rows:
+            row["revision"] = revision
+        created = insert(TaskDB).values(rows).returning(*TaskDB.__table__.c).cte('created_tasks')
+        created_task = aliased(TaskDB, created)
+        res = await db_session.execute(select(created_task).options(task_loading(created_task)))
+        created_tasks = {task.id: task for task in res.scalars().all()}
+        for result in results:
+            if result.id is not None:
+                result.task = TaskResponse.model_validate(created_tasks[result.id])
+        await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.created, list(created_tasks),
+                            db_session)
     await db_session.commit()
-    return updated_task_row
+    return results
+
+
+async def update_tasks_batch(user_id: UUID, items: list[BatchUpdateTask],
+                             db_session: AsyncSession) -> list[BatchTaskResult]:
+    """One UPDATE ... FROM (VALUES ...). Fields left out of an item keep their value, as in update_task_by_id"""
+    owned_subject_ids = await get_owned_subject_ids({item.subject_id for item in items if item.subject_id},
+                                                    user_id, db_session)
+    results = []
+    valid_items = []
+    for index, item in enumerate(items):
+        if item.subject_id is not None and item.subject_id not in owned_subject_ids:
+            results.append(BatchTaskResult(index=index, id=item.id, status=BatchItemStatus.invalid_subject))
+        else:
+            results.append(BatchTaskResult(index=index, id=item.id, status=BatchItemStatus.not_found))
+            valid_items.append(item)
+
+    if valid_items:
+        revision = await bump_revision(user_id, db_session)
+        fields = [name for name in BatchUpdateTask.model_fields if name != 'id']
+        table = TaskDB.__table__
+        changes = values(column('id', table.c.id.type), *(column(name, table.c[name].type) for name in fields),
+                         name='changes') \
+            .data([(item.id, *(getattr(item, name) for name in fields)) for item in valid_items])
+        updated = update(TaskDB) \
+            .where(TaskDB.id == changes.c.id, TaskDB.user_id == user_id) \
+            .values({**{name: func.coalesce(cast(changes.c[name], table.c[name].type), table.c[name])
+                        for name in fields}, 'revision': revision}) \
+            .returning(*table.c) \
+            .cte('updated_tasks')
+        updated_task = aliased(TaskDB, updated)
+        query = select(updated_task).options(task_loading(updated_task)).execution_options(populate_existing=True)
+        res = await db_session.execute(query)
+        updated_tasks = {task.id: task for task in res.scalars().all()}
+        for result in results:
+            if result.status == BatchItemStatus.not_found and result.id in updated_tasks:
+                result.status = BatchItemStatus.updated
+                result.task = TaskResponse.model_validate(updated_tasks[result.id])
+        if not updated_tasks:
+            await db_session.rollback()
+            return results
+        await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.updated, list(updated_tasks),
+                            db_session)
+    await db_session.commit()
+    return results
+
+
+async def delete_tasks_batch(user_id: UUID, ids: list[UUID], db_session: AsyncSession) -> list[BatchTaskResult]:
+    revision = await bump_revision(user_id, db_session)
+    deleted = delete(TaskDB) \
+        .where(TaskDB.id == any_(ids_array('task_ids', ids)), TaskDB.user_id == user_id) \
+        .returning(TaskDB.id) \
+        .cte('deleted_tasks')
+    query = insert_tombstones(TrackerEntities.task, user_id, revision, deleted.c.id).add_cte(deleted)
+    res = await db_session.execute(query)
+    deleted_ids = set(res.scalars().all())
+    if deleted_ids:
+        await notify_change(user_id, revision, TrackerEntities.task, ChangeActions.deleted, list(deleted_ids),
+                            db_session)
+        await db_session.commit()
+    else:
+        await db_session.rollback()
+    return [BatchTaskResult(index=index, id=task_id,
+                            status=BatchItemStatus.deleted if task_id in deleted_ids else BatchItemStatus.not_found)
+            for index, task_id in enumerate(ids)]
+
+
+def task_loading(task_entity):
+    """Task responses embed subject and teacher, both many-to-one, so they are joined in"""
+    return joinedload(task_entity.subject).joinedload(SubjectDB.teacher)
+
+
+IMPORT_ENTITIES = {TeacherDB: TrackerEntities.teacher, SubjectDB: TrackerEntities.subject, TaskDB: TrackerEntities.task}
+IMPORT_COLUMNS = {
+    TeacherDB: ('id', 'name', 'surname', 'father_name', 'phone_number'),
+    SubjectDB: ('id', 'name', 'course', 'teacher_id'),
+    TaskDB: ('id', 'name', 'deadline', 'description', 'type', 'priority', 'subject_id'),
+}
+
+
+IMPORT_READ_BYTES = 64 * 1024
+
+
+def read_text_lines(file: BinaryIO) -> Iterator[str]:
+    """UTF-8 lines of the upload with their line endings. Decodes chunk by chunk instead of wrapping the spooled
+    upload in TextIOWrapper, which needs readable() and seekable() that SpooledTemporaryFile lacks before 3.11"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while chunk := file.read(IMPORT_READ_BYTES):
+        *lines, rest = decoder.decode(chunk).split('\n')
+        if lines:
+            lines[0] = pending + lines[0]
+            yield from (line + '\n' for line in lines)
+            pending = rest
+        else:
+            pending += rest
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def read_import_rows(file: BinaryIO, file_format: FileFormats) -> Iterator[dict | str]:
+    """CSV rows as dicts with empty cells as None, NDJSON rows as raw lines"""
+    try:
+        if file_format == FileFormats.csv:
+            for row in csv.DictReader(read_text_lines(file)):
+                yield {key: value or None for key, value in row.items()}
+        else:
+            for line in read_text_lines(file):
+                if line.strip():
+                    yield line
+    except (UnicodeDecodeError, csv.Error):
+        raise invalid_import_file_exception
+
+
+def validate_import_batch(rows: Iterator[tuple[int, dict | str]], schema: type[BaseModel], columns: tuple[str, ...],
+                          file_format: FileFormats) -> tuple[int, list[tuple], list[ImportRowError]]:
+    """Reads and validates the next import_batch_rows rows. Returns the number of rows read, the COPY records of the
+    valid ones and the errors of the invalid ones"""
+    received = 0
+    records = []
+    errors = []
+    for row_number, row in itertools.islice(rows, settings.import_batch_rows):
+        received += 1
+        try:
+            item = schema.model_validate_json(row) if file_format == FileFormats.ndjson else schema.model_validate(row)
+        except ValidationError as e:
+            errors.append(ImportRowError(row=row_number, detail=e.errors(include_url=False)))
+            continue
+        records.append(tuple((item.id or uuid.uuid4()) if name == 'id' else getattr(item, name) for name in columns))
+    return received, records, errors
+
+
+def import_owner_condition(model, staging, user_id: UUID):
+    """Referenced teacher or subject must belong to the importing user"""
+    if model is SubjectDB:
+        return or_(staging.c.teacher_id.is_(None),
+                   staging.c.teacher_id.in_(select(TeacherDB.id).where(TeacherDB.user_id == user_id)))
+    if model is TaskDB:
+        return staging.c.subject_id.in_(select(SubjectDB.id).where(SubjectDB.user_id == user_id))
+    return true()
+
+
+async def import_by_user_id(user_id: UUID, model, schema: type[BaseModel], file: BinaryIO, file_format: FileFormats,
+                            db_session: AsyncSession) -> ImportResponse:
+    """Validates the upload in batches of import_batch_rows, COPYs valid rows into a temporary staging table
+    and merges it into the model table with one INSERT ... SELECT. Rows with an existing id or a foreign
+    teacher/subject are skipped. Reading and validation run in the threadpool, off the event loop"""
+    columns = IMPORT_COLUMNS[model]
+    staging_name = f"import_{model.__tablename__}"
+    await db_session.execute(text(f"CREATE TEMPORARY TABLE {staging_name} ON COMMIT DROP AS "
+                                  f"SELECT {', '.join(columns)} FROM {model.__tablename__} WITH NO DATA"))
+    connection = await db_session.connection()
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+
+    received = invalid = copied = 0
+    errors = []
+    rows = enumerate(read_import_rows(file, file_format), start=1)
+    while True:
+        batch_received, records, batch_errors = await run_in_threadpool(validate_import_batch, rows, schema, columns,
+                                                                        file_format)
+        if not batch_received:
+            break
+        received += batch_received
+        invalid += len(batch_errors)
+        errors += batch_errors[:settings.import_max_errors - len(errors)]
+        if records:
+            await driver_connection.copy_records_to_table(staging_name, records=records, columns=columns)
+            copied += len(records)
+
+    imported = 0
+    if copied:
+        revision = await bump_revision(user_id, db_session)
+        staging = table(staging_name, *(column(name) for name in columns))
+        rows = select(*staging.c, literal(user_id, model.user_id.type).label('user_id'),
+                      literal(revision, model.revision.type).label('revision')) \
+            .where(import_owner_condition(model, staging, user_id))
+        inserted = pg_insert(model).from_select([*columns, 'user_id', 'revision'], rows) \
+            .on_conflict_do_nothing(index_elements=['id']) \
+            .returning(model.id) \
+            .cte('imported')
+        res = await db_session.execute(select(func.count()).select_from(inserted))
+        imported = res.scalar_one()
+    if imported:
+        await notify_change(user_id, revision, IMPORT_ENTITIES[model], ChangeActions.created, None, db_session)
+        await db_session.commit()
+    else:
+        await db_session.rollback()
+    return ImportResponse(received=received, imported=imported, skipped=copied - imported, invalid=invalid,
+                          errors=errors)
+
+
+SYNC_COLUMNS = {
+    TeacherDB: (TeacherDB.id, TeacherDB.name, TeacherDB.surname, TeacherDB.father_name, TeacherDB.phone_number,
+                TeacherDB.revision, TeacherDB.updated_at),
+    SubjectDB: (SubjectDB.id, SubjectDB.name, SubjectDB.course, SubjectDB.teacher_id, SubjectDB.revision,
+                SubjectDB.updated_at),
+    TaskDB: (TaskDB.id, TaskDB.name, TaskDB.deadline, TaskDB.description, TaskDB.type, TaskDB.priority, TaskDB.status,
+             TaskDB.subject_id, TaskDB.revision, TaskDB.updated_at),
+}
+
+SYNC_KEYS = {TeacherDB: "teachers", SubjectDB: "subjects", TaskDB: "tasks"}
+TOMBSTONE_MODELS = {TrackerEntities.teacher: TeacherDB, TrackerEntities.subject: SubjectDB,
+                    TrackerEntities.task: TaskDB}
+
+
+async def get_changes_by_user_id(user_id: UUID, since: int, db_session: AsyncSession) -> dict:
+    """Same shape as SyncResponse. Rows stamped after since and ids of rows deleted after it, or everything with
+    reset when the client has nothing (since 0) or a revision this server never handed out.
+    The revision is read first: rows of a change committed in between come again with the next sync, never get lost"""
+    revision = await get_revision(user_id, db_session)
+    reset = since == 0 or since > revision
+    changes = {"revision": revision, "reset": reset}
+    for model, key in SYNC_KEYS.items():
+        query = select(*SYNC_COLUMNS[model]).where(model.user_id == user_id)
+        if not reset:
+            query = query.where(model.revision > since)
+        res = await db_session.execute(query)
+        changes[key] = [dict(row) for row in res.mappings()]
+
+    deleted = {key: [] for key in SYNC_KEYS.values()}
+    if not reset:
+        query = select(TombstoneDB.entity, TombstoneDB.entity_id) \
+            .where(TombstoneDB.user_id == user_id, TombstoneDB.revision > since)
+        res = await db_session.execute(query)
+        alive = {row["id"] for key in deleted for row in changes[key]}
+        for entity, entity_id in res:
+            if entity_id not in alive:
+                deleted[SYNC_KEYS[TOMBSTONE_MODELS[TrackerEntities(entity)]]].append(entity_id)
+    changes["deleted"] = deleted
+    return changes
+
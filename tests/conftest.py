@@ -0,0 +1,6 @@
+import os
+
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "test", "DB_USER": "test",
+                    "DB_PASS": "test", "SECRET": "test", "ALGORITHM": "HS256",
+                    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "REMINDERS_ENABLED": "false"}.items():
+    os.environ.setdefault(name, value)
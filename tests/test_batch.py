@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from src.auth.dependencies import get_current_principal
+from src.auth.schemas import Principal, Roles
+from src.database import get_session
+from src.main import app
+from src.tracker import service
+
+PRINCIPAL = Principal(id=uuid4(), roles=[Roles.user], token_version=0)
+SUBJECT_ID = uuid4()
+FOREIGN_SUBJECT_ID = uuid4()
+TASK_ID = uuid4()
+
+
+class Result:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self) -> list:
+        return self.rows
+
+    def scalar_one(self):
+        return self.rows[0]
+
+
+class StubSession:
+    """Compiles every statement with the postgresql dialect and answers with the next scripted rows"""
+
+    def __init__(self, *results: list):
+        self.results = list(results)
+        self.statements: list[str] = []
+        self.committed = False
+        self.rolled_back = False
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return Result(self.results.pop(0) if self.results else [])
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+def task_row(task_id):
+    subject = SimpleNamespace(id=SUBJECT_ID, name="Math", course=1, teacher=None)
+    return SimpleNamespace(id=task_id, name="Lab 1", deadline=None, description=None, type=None, priority="Medium",
+                           status=False, subject=subject)
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_principal] = lambda: PRINCIPAL
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def use_session(session: StubSession) -> StubSession:
+    app.dependency_overrides[get_session] = lambda: session
+    return session
+
+
+def statuses(response) -> list[str]:
+    return [result["status"] for result in response.json()["results"]]
+
+
+def test_create(client, monkeypatch):
+    monkeypatch.setattr(service.uuid, "uuid4", lambda: TASK_ID)
+    session = use_session(StubSession([SUBJECT_ID], [1], [task_row(TASK_ID)]))
+
+    response = client.post("/tasks/batch", json=[
+        {"name": "Lab 1", "priority": "Medium", "subject_id": str(SUBJECT_ID)},
+        {"name": "Lab 2", "priority": "Low", "subject_id": str(FOREIGN_SUBJECT_ID)},
+    ])
+
+    assert response.status_code == 200
+    assert statuses(response) == ["created", "invalid_subject"]
+    assert response.json()["results"][0]["task"]["id"] == str(TASK_ID)
+    assert any(statement.startswith("WITH created_tasks AS") for statement in session.statements)
+    assert session.committed
+
+
+def test_update(client):
+    session = use_session(StubSession([SUBJECT_ID], [2], [task_row(TASK_ID)]))
+
+    response = client.patch("/tasks/batch", json=[
+        {"id": str(TASK_ID), "name": "Lab 1", "subject_id": str(SUBJECT_ID)},
+        {"id": str(uuid4()), "status": True},
+        {"id": str(uuid4()), "subject_id": str(FOREIGN_SUBJECT_ID)},
+    ])
+
+    assert response.status_code == 200
+    assert statuses(response) == ["updated", "not_found", "invalid_subject"]
+    update = next(statement for statement in session.statements if "UPDATE tasks SET" in statement)
+    assert "name=coalesce(CAST(changes.name AS VARCHAR(100)), tasks.name)" in update
+    assert "revision=%(param_1)s" in update
+    assert session.committed
+
+
+def test_update_nothing_found(client):
+    session = use_session(StubSession([2], []))
+
+    response = client.patch("/tasks/batch", json=[{"id": str(uuid4()), "status": True}])
+
+    assert statuses(response) == ["not_found"]
+    assert session.rolled_back and not session.committed
+
+
+def test_delete(client):
+    other_id = uuid4()
+    session = use_session(StubSession([3], [TASK_ID]))
+
+    response = client.request("DELETE", "/tasks/batch", json={"ids": [str(TASK_ID), str(other_id)]})
+
+    assert statuses(response) == ["deleted", "not_found"]
+    assert session.committed
+
+
+@pytest.mark.parametrize("method,body", [
+    ("PATCH", [{"id": str(TASK_ID), "status": True}, {"id": str(TASK_ID), "status": False}]),
+    ("DELETE", {"ids": [str(TASK_ID), str(TASK_ID)]}),
+])
+def test_duplicate_ids(client, method, body):
+    session = use_session(StubSession())
+
+    response = client.request(method, "/tasks/batch", json=body)
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Batch contains duplicate ids"
+    assert session.statements == []
@@ -0,0 +1,92 @@
+from typing import Annotated
+from uuid import uuid4
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src import database
+from src.auth.dependencies import get_current_principal
+from src.database import get_session
+from src.auth.schemas import Principal, Roles
+from src.main import app
+from src.metrics import count_checkout, metrics
+from src.tracker import dependencies as tracker_dependencies
+from src.tracker import router as tracker_router
+
+PRINCIPAL = Principal(id=uuid4(), roles=[Roles.user], token_version=0)
+EMPTY_STATS = {"total": 0, "done": 0, "overdue": 0, "completion_ratio": 0, "by_priority": {}, "by_type": {},
+               "subjects": []}
+
+
+@pytest.fixture
+def received(monkeypatch, tmp_path) -> list[tuple[str, AsyncSession]]:
+    """Sessions passed to the service functions of a request. Every function runs one statement, so a request that
+    shares its session checks out exactly one connection"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    event.listen(engine.sync_engine.pool, "checkout", count_checkout)
+    monkeypatch.setattr(database, "async_session", async_sessionmaker(engine, expire_on_commit=False,
+                                                                      class_=AsyncSession))
+    calls = []
+
+    def service(name: str, result):
+        async def call(*args):
+            session = args[-1]
+            calls.append((name, session))
+            await session.execute(text("select 1"))
+            return result
+        return call
+
+    monkeypatch.setattr(tracker_dependencies, "get_revision", service("check_etag", 0))
+    monkeypatch.setattr(tracker_dependencies, "get_task_by_id", service("check_task_id", None))
+    monkeypatch.setattr(tracker_router, "get_tasks_stats_by_user_id", service("endpoint", EMPTY_STATS))
+    app.dependency_overrides[get_current_principal] = lambda: PRINCIPAL
+    yield calls
+    app.dependency_overrides.clear()
+
+
+def get(path: str, route: str) -> tuple[int, int]:
+    """Status code and pool checkouts of one request"""
+    checkouts = metrics.connections[("GET", route)]
+    response = TestClient(app).get(path)
+    return response.status_code, metrics.connections[("GET", route)] - checkouts
+
+
+def test_check_id_and_etag_share_session(received):
+    status_code, checkouts = get(f"/tasks/{uuid4()}", "/tasks/{task_id}")
+
+    assert status_code == 404
+    assert [name for name, _ in received] == ["check_etag", "check_task_id"]
+    assert received[0][1] is received[1][1]
+    assert isinstance(received[0][1], AsyncSession)
+    assert checkouts == 1
+
+
+def test_endpoint_and_etag_share_session(received):
+    status_code, checkouts = get("/tasks/stats", "/tasks/stats")
+
+    assert status_code == 200
+    assert [name for name, _ in received] == ["check_etag", "endpoint"]
+    assert received[0][1] is received[1][1]
+    assert checkouts == 1
+
+
+def test_requests_get_own_sessions(received):
+    get("/tasks/stats", "/tasks/stats")
+    get("/tasks/stats", "/tasks/stats")
+
+    assert received[0][1] is not received[2][1]
+
+
+def test_uncached_dependency_shares_session(received):
+    uncached_app = FastAPI()
+
+    @uncached_app.get("/")
+    async def endpoint(cached: Annotated[AsyncSession, Depends(get_session)],
+                       uncached: Annotated[AsyncSession, Depends(get_session, use_cache=False)]):
+        return cached is uncached
+
+    assert TestClient(uncached_app).get("/").json() is True
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from fastapi import HTTPException
+
+from src.tracker import service
+from src.tracker.models import Teacher as TeacherDB
+from src.tracker.schemas import FileFormats, ImportTeacher
+
+
+class Upload:
+    """Only read(), like SpooledTemporaryFile before Python 3.11 which has no readable() or seekable()"""
+
+    def __init__(self, content: bytes):
+        self._buffer = io.BytesIO(content)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """Multibyte characters and quoted line breaks end up split between chunks"""
+    monkeypatch.setattr(service, "IMPORT_READ_BYTES", 3)
+
+
+def test_csv_rows():
+    content = '﻿id,name,surname\r\n,Иван,"Пет\nров"\r\n,Анна,\r\n'.encode()
+
+    rows = list(service.read_import_rows(Upload(content), FileFormats.csv))
+
+    assert rows == [{"id": None, "name": "Иван", "surname": "Пет\nров"},
+                    {"id": None, "name": "Анна", "surname": None}]
+
+
+def test_ndjson_rows_skip_blank_lines():
+    content = '{"name": "Иван"}\n\n{"name": "Анна"}'.encode()
+
+    rows = list(service.read_import_rows(Upload(content), FileFormats.ndjson))
+
+    assert rows == ['{"name": "Иван"}\n', '{"name": "Анна"}']
+
+
+def test_invalid_encoding():
+    with pytest.raises(HTTPException):
+        list(service.read_import_rows(Upload(b'{"name": "\xff"}\n'), FileFormats.ndjson))
+
+
+def test_validate_import_batch(monkeypatch):
+    monkeypatch.setattr(service.settings, "import_batch_rows", 2)
+    content = b'{"name": "a", "surname": "b"}\n{"name": 1}\n{"name": "c", "surname": "d"}\n'
+    rows = enumerate(service.read_import_rows(Upload(content), FileFormats.ndjson), start=1)
+    columns = service.IMPORT_COLUMNS[TeacherDB]
+
+    received, records, errors = service.validate_import_batch(rows, ImportTeacher, columns, FileFormats.ndjson)
+    assert (received, len(records), [error.row for error in errors]) == (2, 1, [2])
+    received, records, errors = service.validate_import_batch(rows, ImportTeacher, columns, FileFormats.ndjson)
+    assert (received, len(records), errors) == (1, 1, [])
+    assert service.validate_import_batch(rows, ImportTeacher, columns, FileFormats.ndjson) == (0, [], [])
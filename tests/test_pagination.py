@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from src.pagination import decode_cursor, encode_cursor, keyset_condition, paginate
+from src.tracker.models import Task as TaskDB
+from src.tracker.schemas import TaskSorts
+
+DEADLINE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def compiled(condition) -> str:
+    return str(condition.compile(dialect=postgresql.dialect()))
+
+
+def raw_cursor(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).rstrip(b"=").decode()
+
+
+@pytest.mark.parametrize("value,descending,expected", [
+    # ASC puts NULLs last: after a value come greater values, equal values with a greater id, then all NULLs
+    (DEADLINE, False, "tasks.deadline > %(deadline_1)s OR tasks.deadline = %(deadline_2)s "
+                      "AND tasks.id > %(id_1)s::UUID OR tasks.deadline IS NULL"),
+    # After a NULL only NULLs with a greater id remain
+    (None, False, "tasks.deadline IS NULL AND tasks.id > %(id_1)s::UUID"),
+    # DESC puts NULLs first: after a value only smaller values and equal values with a smaller id remain
+    (DEADLINE, True, "tasks.deadline < %(deadline_1)s OR tasks.deadline = %(deadline_2)s "
+                     "AND tasks.id < %(id_1)s::UUID"),
+    # After a NULL come NULLs with a smaller id, then every value
+    (None, True, "tasks.deadline IS NULL AND tasks.id < %(id_1)s::UUID OR tasks.deadline IS NOT NULL"),
+])
+def test_keyset_condition(value, descending, expected):
+    assert compiled(keyset_condition(TaskDB.deadline, value, TaskDB.id, uuid4(), descending)) == expected
+
+
+def test_keyset_condition_without_sort():
+    assert compiled(keyset_condition(None, None, TaskDB.id, uuid4(), False)) == "tasks.id > %(id_1)s::UUID"
+
+
+@pytest.mark.parametrize("sort,value,sort_expr", [
+    (TaskSorts.by_deadline, DEADLINE, TaskDB.deadline),
+    (TaskSorts.by_deadline, None, TaskDB.deadline),
+    (TaskSorts.by_priority, 2, TaskDB.priority_rank),
+    (TaskSorts.by_status, True, TaskDB.status),
+    (None, None, None),
+])
+def test_cursor_round_trip(sort, value, sort_expr):
+    last_id = uuid4()
+
+    assert decode_cursor(encode_cursor(sort, True, value, last_id), sort, True, sort_expr) == (value, last_id)
+
+
+@pytest.mark.parametrize("sort,descending", [(TaskSorts.by_name, True), (TaskSorts.by_deadline, False)])
+def test_cursor_of_another_sort_is_rejected(sort, descending):
+    cursor = encode_cursor(TaskSorts.by_deadline, True, DEADLINE, uuid4())
+
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, sort, descending, TaskDB.name)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor,sort,sort_expr", [
+    (raw_cursor({"s": "deadline", "d": False, "id": str(uuid4()), "v": "abc"}), "deadline", TaskDB.deadline),
+    (raw_cursor({"s": "deadline", "d": False, "id": str(uuid4()), "v": "abc", "t": "dt"}), "deadline", TaskDB.deadline),
+    (raw_cursor({"s": "priority", "d": False, "id": str(uuid4()), "v": "1"}), "priority", TaskDB.priority_rank),
+    (raw_cursor({"s": "priority", "d": False, "id": str(uuid4()), "v": True}), "priority", TaskDB.priority_rank),
+    (raw_cursor({"s": "name", "d": False, "id": "not-a-uuid", "v": "a"}), "name", TaskDB.name),
+    (raw_cursor({"s": None, "d": False, "id": str(uuid4()), "v": 1}), None, None),
+    (raw_cursor([1, 2]), None, None),
+    ("!!!", None, None),
+])
+def test_tampered_cursor_is_rejected(cursor, sort, sort_expr):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, sort, False, sort_expr)
+    assert exc_info.value.status_code == 400
+
+
+def test_paginate():
+    rows = [SimpleNamespace(id=uuid4(), name=name) for name in "abc"]
+
+    page, cursor = paginate(rows, "name", False, 2, lambda row: row.name)
+    assert page == rows[:2]
+    assert decode_cursor(cursor, "name", False, TaskDB.name) == ("b", rows[1].id)
+    assert paginate(rows, "name", False, 3, lambda row: row.name) == (rows, None)
+    assert paginate(rows, "name", False, None, lambda row: row.name) == (rows, None)
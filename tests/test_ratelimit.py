@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src import ratelimit
+from src.metrics import metrics
+from src.ratelimit import Limit, MemoryStore
+
+LIMIT = Limit("test", capacity=3, period=60)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def take(store: MemoryStore, key: str = "key", limit: Limit = LIMIT) -> float:
+    return asyncio.run(store.take(key, limit))
+
+
+def test_parse():
+    assert Limit.parse("login", "10/minute") == Limit("login", 10, 60)
+    assert Limit.parse("login", "5/ hour").rate == 5 / 3600
+
+
+def test_burst(clock):
+    store = MemoryStore(max_keys=10)
+
+    assert [take(store) for _ in range(3)] == [0, 0, 0]
+    assert take(store) == pytest.approx(20)
+
+
+def test_refill(clock):
+    store = MemoryStore(max_keys=10)
+    for _ in range(3):
+        take(store)
+
+    clock.now += 10
+    assert take(store) == pytest.approx(10)
+    clock.now += 10
+    assert take(store) == 0
+    assert take(store) == pytest.approx(20)
+
+
+def test_refill_is_capped(clock):
+    store = MemoryStore(max_keys=10)
+    take(store)
+
+    clock.now += 3600
+    assert [take(store) for _ in range(3)] == [0, 0, 0]
+    assert take(store) > 0
+
+
+def test_keys_are_independent_and_least_recent_dropped(clock):
+    store = MemoryStore(max_keys=2)
+    for _ in range(3):
+        take(store, "a")
+    take(store, "b")
+
+    assert take(store, "b") == 0
+    take(store, "c")
+    assert take(store, "a") == 0
+
+
+def test_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "store", MemoryStore(max_keys=10))
+    monkeypatch.setattr(ratelimit.settings, "ratelimit_enabled", True)
+    limit = Limit("test_retry_after", capacity=1, period=7)
+    asyncio.run(ratelimit.check_limit(limit, "key"))
+    clock.now += 0.5
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(ratelimit.check_limit(limit, "key"))
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers == {"Retry-After": "7"}
+    assert metrics.rate_limited["test_retry_after"] == 1